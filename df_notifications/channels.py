@@ -1,20 +1,38 @@
 import json
 import logging
-from typing import Dict, Iterable
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from copy import copy
+from itertools import islice
+from smtplib import SMTPServerDisconnected
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 import requests
 from df_api_drf.resolvers import client_url
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.utils import timezone
 from django_slack import slack_message
+from fcm_django.settings import FCM_DJANGO_SETTINGS as FCM_SETTINGS
+from firebase_admin import messaging
 from firebase_admin.firestore import client
 from firebase_admin.messaging import (
+    BatchResponse,
     Message,
     Notification,
+    SenderIdMismatchError,
+    UnregisteredError,
     WebpushConfig,
     WebpushFCMOptions,
 )
 from otp_twilio.models import TwilioSMSDevice
+from requests.adapters import HTTPAdapter
+
+from df_notifications.instrumentation import timings
+from df_notifications.settings import api_settings
 
 
 class BaseChannel:
@@ -23,21 +41,119 @@ class BaseChannel:
     def send(self, users: Iterable, context: Dict[str, str]) -> None:
         pass
 
+    def send_batch(
+        self, messages: Iterable[Tuple[Iterable, Dict[str, str]]]
+    ) -> List[Any]:
+        """
+        Sends every message and returns the result of each, in order: the
+        exception it failed with, or anything else when it was delivered.
+        """
+        results: List[Any] = []
+        for users, context in messages:
+            try:
+                self.send(users, context)
+            except Exception as e:
+                results.append(e)
+            else:
+                results.append(None)
+        return results
+
 
 class EmailChannel(BaseChannel):
+    """
+    Sends through a backend connection kept open per thread and reused until
+    it has been idle for `EMAIL_CONNECTION_IDLE_TIMEOUT` seconds.
+
+    A connection the server closed while idle is reopened once. With
+    `EMAIL_PER_RECIPIENT` every recipient gets their own message.
+    """
+
     template_parts = ["subject.txt", "body.txt", "body.html"]
 
+    def __init__(self) -> None:
+        self._local = threading.local()
+
     def send(self, users: Iterable, context: Dict[str, str]) -> None:
-        recipients = context.get(
+        self.send_messages(self.build_messages(users, context))
+
+    def send_batch(
+        self, messages: Iterable[Tuple[Iterable, Dict[str, str]]]
+    ) -> List[Any]:
+        """
+        Sends the emails of every notification over one connection and returns
+        the exception each notification failed with, or None.
+        """
+        results: List[Any] = []
+        for users, context in messages:
+            try:
+                self.send_messages(self.build_messages(users, context))
+            except Exception as e:
+                results.append(e)
+            else:
+                results.append(None)
+        return results
+
+    def build_messages(
+        self, users: Iterable, context: Dict[str, str]
+    ) -> List[EmailMultiAlternatives]:
+        recipients: Any = context.get(
             "recipients", [user.email for user in users if user.email]
         )
-        msg = EmailMultiAlternatives(
-            subject=context["subject.txt"], to=recipients, body=context["body.txt"]
-        )
-        msg.attach_alternative(context["body.html"], "text/html")
-        for attachment in context.get("attachments", []):
-            msg.attach(**attachment)  # type: ignore
-        msg.send()
+        if api_settings.EMAIL_PER_RECIPIENT:
+            groups = [[recipient] for recipient in recipients]
+        else:
+            groups = [recipients]
+
+        messages = []
+        for to in groups:
+            msg = EmailMultiAlternatives(
+                subject=context["subject.txt"], to=to, body=context["body.txt"]
+            )
+            msg.attach_alternative(context["body.html"], "text/html")
+            for attachment in context.get("attachments", []):
+                msg.attach(**attachment)  # type: ignore
+            messages.append(msg)
+        return messages
+
+    def get_connection(self) -> Any:
+        connection = getattr(self._local, "connection", None)
+        idle = time.monotonic() - getattr(self._local, "last_used", 0)
+        if connection is not None and idle > api_settings.EMAIL_CONNECTION_IDLE_TIMEOUT:
+            self.close_connection()
+            connection = None
+        if connection is None:
+            connection = get_connection()
+            connection.open()
+            self._local.connection = connection
+        return connection
+
+    def close_connection(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                logging.exception("Failed to close email connection")
+
+    def send_messages(self, messages: List[EmailMultiAlternatives]) -> None:
+        if not messages:
+            return
+        for attempt in range(2):
+            connection = self.get_connection()
+            try:
+                connection.send_messages(messages)
+            except SMTPServerDisconnected:
+                self.close_connection()
+                if attempt:
+                    raise
+            except Exception:
+                # The connection may be broken, open a new one next time
+                self.close_connection()
+                raise
+            else:
+                break
+        self._local.last_used = time.monotonic()
 
 
 class ConsoleChannel(BaseChannel):
@@ -49,9 +165,101 @@ class ConsoleChannel(BaseChannel):
         )
 
 
+class FirebaseMessagingClient:
+    def send_each(self, messages: List[Message]) -> BatchResponse:
+        return messaging.send_each(messages, app=FCM_SETTINGS["DEFAULT_FIREBASE_APP"])
+
+
+class PushEngine:
+    """
+    Sends a message to every active device of a queryset.
+
+    Tokens are streamed from the database in chunks of `PUSH_CHUNK_SIZE` (the
+    FCM batch limit) and the chunks are sent concurrently by at most
+    `PUSH_CONCURRENCY` threads. No more chunks than that are read ahead, the
+    next chunk is read only once a running one has finished. Devices whose
+    tokens FCM rejected are deactivated with a single UPDATE.
+    """
+
+    invalid_token_errors = (UnregisteredError, SenderIdMismatchError)
+
+    def __init__(self, client: Any = None) -> None:
+        self.client = client or FirebaseMessagingClient()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=api_settings.PUSH_CONCURRENCY,
+                    thread_name_prefix="df_notifications_push",
+                )
+            return self._executor
+
+    def send(self, message: Message, devices: Any) -> Dict[str, Any]:
+        chunk_size = api_settings.PUSH_CHUNK_SIZE
+        tokens = (
+            devices.filter(active=True)
+            .values_list("registration_id", flat=True)
+            .iterator(chunk_size=chunk_size)
+        )
+        results: Dict[str, Any] = {}
+        pending: Dict[Future, List[str]] = {}
+        while chunk := list(islice(tokens, chunk_size)):
+            if len(pending) >= api_settings.PUSH_CONCURRENCY:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.collect(pending.pop(future), future, results)
+            pending[self.executor.submit(self.send_chunk, message, chunk)] = chunk
+
+        for future in wait(pending).done:
+            self.collect(pending[future], future, results)
+
+        self.deactivate(devices, results)
+        return results
+
+    def collect(
+        self, chunk: List[str], future: Future, results: Dict[str, Any]
+    ) -> None:
+        try:
+            results.update(zip(chunk, future.result().responses))
+        except Exception as e:
+            logging.exception("Failed to send %s push messages", len(chunk))
+            results.update((token, e) for token in chunk)
+
+    def send_chunk(self, message: Message, tokens: List[str]) -> BatchResponse:
+        messages = []
+        for token in tokens:
+            token_message = copy(message)
+            token_message.token = token
+            messages.append(token_message)
+        return self.client.send_each(messages)
+
+    def deactivate(self, devices: Any, results: Dict[str, Any]) -> None:
+        invalid = [
+            token
+            for token, response in results.items()
+            if isinstance(
+                getattr(response, "exception", None), self.invalid_token_errors
+            )
+        ]
+        if invalid:
+            devices.model.objects.filter(registration_id__in=invalid).update(
+                active=False
+            )
+
+
+push_engine = PushEngine()
+
+
 class FirebasePushChannel(BaseChannel):
     template_parts = ["subject.txt", "body.txt", "data.json"]
 
+    def __init__(self, client: Any = None) -> None:
+        self.engine = push_engine if client is None else PushEngine(client)
+
     def send(self, users: Iterable, context: Dict[str, str]) -> None:
         try:
             devices = context["devices_queryset"]
@@ -79,19 +287,133 @@ class FirebasePushChannel(BaseChannel):
                         + action_url
                     )
                 )
-            devices.filter(user__in=users).send_message(message)
+            self.engine.send(message, devices.filter(user__in=users))
 
 
 class JSONPostWebhookChannel(BaseChannel):
+    """
+    Posts through keep-alive sessions, one per destination host and thread.
+
+    Requests time out after `WEBHOOK_CONNECT_TIMEOUT`/`WEBHOOK_READ_TIMEOUT`
+    seconds and `send_batch` delivers from at most `WEBHOOK_CONCURRENCY`
+    threads. Latency is recorded in timings per destination host.
+
+    With `WEBHOOK_BATCH_SIZE` set, notifications to the same URL are posted
+    together as a JSON array of their `data.json` payloads. A response that is
+    a JSON array of the same length is mapped back item by item. Rules with
+    `coalesce_on_commit` deliver the notifications of one transaction through
+    `send_batch`.
+    """
+
     template_parts = ["subject.txt", "body.txt", "data.json"]
 
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=api_settings.WEBHOOK_CONCURRENCY,
+                    thread_name_prefix="df_notifications_webhook",
+                )
+            return self._executor
+
+    def get_session(self, host: str) -> requests.Session:
+        sessions = self._local.__dict__.setdefault("sessions", {})
+        if host not in sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=api_settings.WEBHOOK_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            sessions[host] = session
+        return sessions[host]
+
     def send(self, users: Iterable, context: Dict[str, str]) -> None:
-        requests.post(
+        self.post(context)
+
+    def send_batch(
+        self, messages: Iterable[Tuple[Iterable, Dict[str, str]]]
+    ) -> List[Any]:
+        return self.deliver([context for _, context in messages])
+
+    def deliver(self, contexts: List[Dict[str, str]]) -> List[Any]:
+        """
+        Posts the contexts concurrently and returns the result of each, in
+        order: its response or batch response item, or the exception raised.
+        """
+        batch_size = api_settings.WEBHOOK_BATCH_SIZE
+        if batch_size:
+            by_url: Dict[str, List[int]] = defaultdict(list)
+            for i, context in enumerate(contexts):
+                by_url[context["subject.txt"].strip()].append(i)
+            jobs = [
+                indexes[j : j + batch_size]
+                for indexes in by_url.values()
+                for j in range(0, len(indexes), batch_size)
+            ]
+        else:
+            jobs = [[i] for i in range(len(contexts))]
+
+        futures = [
+            (
+                job,
+                self.executor.submit(
+                    self.post_many if batch_size else self.post_one,
+                    [contexts[i] for i in job],
+                ),
+            )
+            for job in jobs
+        ]
+        results: List[Any] = [None] * len(contexts)
+        for job, future in futures:
+            try:
+                job_results = future.result()
+            except Exception as e:
+                logging.exception("Failed to deliver %s webhooks", len(job))
+                job_results = [e] * len(job)
+            for i, result in zip(job, job_results):
+                results[i] = result
+        return results
+
+    def post_one(self, contexts: List[Dict[str, str]]) -> List[requests.Response]:
+        return [self.post(contexts[0])]
+
+    def post_many(self, contexts: List[Dict[str, str]]) -> List[Any]:
+        url = contexts[0]["subject.txt"].strip()
+        response = self.request(
+            url, json=[json.loads(context["data.json"]) for context in contexts]
+        )
+        try:
+            items = response.json()
+        except ValueError:
+            items = None
+        if isinstance(items, list) and len(items) == len(contexts):
+            return items
+        return [response] * len(contexts)
+
+    def post(self, context: Dict[str, str]) -> requests.Response:
+        return self.request(
             context["subject.txt"].strip(),
             data=context["body.txt"].strip(),
             json=json.loads(context["data.json"]),
         )
 
+    def request(self, url: str, **kwargs: Any) -> requests.Response:
+        host = urlsplit(url).netloc
+        with timings.measure("webhooks.post", host=host):
+            return self.get_session(host).post(
+                url,
+                timeout=(
+                    api_settings.WEBHOOK_CONNECT_TIMEOUT,
+                    api_settings.WEBHOOK_READ_TIMEOUT,
+                ),
+                **kwargs,
+            )
+
 
 class SlackChannel(BaseChannel):
     template_parts = ["subject.txt", "body.txt"]
@@ -130,3 +452,41 @@ class TwilioSMSChannel(BaseChannel):
     def send(self, users: Iterable, context: Dict[str, str]) -> None:
         for device in TwilioSMSDevice.objects.filter(user__in=users):
             device._deliver_token(context["body.txt"])
+
+
+class SinkChannelError(Exception):
+    pass
+
+
+class SinkChannel(BaseChannel):
+    """
+    Records deliveries in memory instead of sending them, for load tests.
+
+    Every send sleeps `SINK_CHANNEL_LATENCY_MS` milliseconds and fails with
+    `SinkChannelError` with probability `SINK_CHANNEL_FAILURE_RATE`.
+    """
+
+    template_parts = ["subject.txt", "body.txt"]
+
+    def __init__(self) -> None:
+        self.deliveries: List[Dict[str, Any]] = []
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def send(self, users: Iterable, context: Dict[str, str]) -> None:
+        latency = api_settings.SINK_CHANNEL_LATENCY_MS
+        if latency:
+            time.sleep(latency / 1000)
+        if random.random() < api_settings.SINK_CHANNEL_FAILURE_RATE:  # noqa: S311
+            with self._lock:
+                self.failures += 1
+            raise SinkChannelError("Simulated delivery failure")
+        with self._lock:
+            self.deliveries.append(
+                {"users": list(users), "context": context, "sent_at": time.time()}
+            )
+
+    def reset(self) -> None:
+        with self._lock:
+            self.deliveries = []
+            self.failures = 0
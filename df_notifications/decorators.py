@@ -1,11 +1,25 @@
+from collections import defaultdict
 from contextlib import contextmanager
-from typing import Any, Dict, Generator, Type
+from copy import copy
+from functools import wraps
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 from django.contrib import admin
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import transaction
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.db import models, transaction
 from django.db.models import QuerySet
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.http import HttpRequest
 from django.template import TemplateDoesNotExist
 from django.template.loader import get_template
@@ -14,7 +28,22 @@ from django.utils.safestring import mark_safe
 from import_export.admin import ImportExportMixin
 from import_export.resources import ModelResource
 
-from df_notifications.models import M, NotificationModelMixin, get_channel_instance
+from df_notifications.instrumentation import timings
+from df_notifications.models import (
+    BaseModelReminder,
+    BaseModelRule,
+    M,
+    ModelSnapshot,
+    NotificationModelMixin,
+    NotificationModelReminder,
+    get_channel_instance,
+)
+from df_notifications.rule_cache import rule_cache
+from df_notifications.template_cache import get_template_names
+from df_notifications.utils import get_commit_buffers
+
+R = TypeVar("R", bound=BaseModelRule)
+RM = TypeVar("RM", bound=NotificationModelReminder)
 
 
 @contextmanager
@@ -41,10 +70,70 @@ def disable_notification_signal(sender: Type[M]) -> Generator[None, None, None]:
         )
 
 
+def get_snapshot_fields(model: Type[M]) -> Optional[List[str]]:
+    """
+    Fields to capture at load time, or None if a rule needs the previous row.
+    """
+    fields: Set[str] = set()
+    for rule_class in rule_classes[model]:
+        if (
+            not rule_class.snapshot_on_load
+            or rule_class.tracking_fields is None
+            or rule_class.requires_previous_instance
+        ):
+            return None
+        fields.update(rule_class.tracking_fields)
+
+    if any(model._meta.get_field(field).is_relation for field in fields):
+        return None
+    return sorted(fields)
+
+
+def save_instance_snapshot(
+    sender: Type[M], instance: M, **kwargs: Dict[Any, Any]
+) -> None:
+    fields = snapshot_fields.get(sender)
+    if fields is not None:
+        instance._df_snapshot = ModelSnapshot.capture(instance, fields)
+
+
+def refresh_instance_snapshot(model: Type[M]) -> None:
+    """
+    Wraps `refresh_from_db` of the model so it also refreshes the snapshot,
+    which signals alone would leave at the values loaded before the refresh.
+    """
+    refresh_from_db = model.refresh_from_db
+    if getattr(refresh_from_db, "refreshes_snapshot", False):
+        return
+
+    @wraps(refresh_from_db)
+    def wrapper(self: M, *args: Any, **kwargs: Any) -> None:
+        refresh_from_db(self, *args, **kwargs)
+        fields = kwargs.get("fields", args[1] if len(args) > 1 else None)
+        snapshot = getattr(self, "_df_snapshot", None)
+        if fields is None or snapshot is None:
+            save_instance_snapshot(model, self)
+            return
+        for field in fields:
+            if field in snapshot.__dict__ and field in self.__dict__:
+                setattr(snapshot, field, copy(self.__dict__[field]))
+
+    wrapper.refreshes_snapshot = True  # type: ignore
+    model.refresh_from_db = wrapper  # type: ignore
+
+
 def save_previous_instance(
     sender: Type[M], instance: Type[M], **kwargs: Dict[Any, Any]
 ) -> None:
-    if instance.pk:
+    snapshot = getattr(instance, "_df_snapshot", None)
+    if (
+        snapshot is not None
+        and sender in snapshot_fields
+        and not instance._state.adding
+        and snapshot.pk == instance.pk
+    ):
+        instance._pre_save_instance = snapshot
+    elif instance.pk:
         try:
             instance._pre_save_instance = sender.objects.get(pk=instance.pk)
         except ObjectDoesNotExist:
@@ -64,7 +153,7 @@ def create_proxy_model(model_class: Type[object]) -> type:
     )
 
 
-def register_notification_model_admin(model_class: Type[object]) -> None:
+def register_notification_model_admin(model_class: Type[object]) -> type:
     ProxyModel = create_proxy_model(model_class)
 
     @admin.register(ProxyModel)
@@ -98,11 +187,9 @@ def register_notification_model_admin(model_class: Type[object]) -> None:
                 assert isinstance(item, NotificationModelMixin)
 
                 for part in get_channel_instance(item.channel).template_parts:
-                    names = [
-                        f"{item.template_prefix}{item.channel}__{part}",
-                        f"{item.template_prefix}{part}",
-                    ]
-                    for name in names:
+                    for name in get_template_names(
+                        item.channel, [item.template_prefix], part
+                    ):
                         try:
                             with transaction.atomic():
                                 Template.objects.filter(name=name).delete()
@@ -114,42 +201,170 @@ def register_notification_model_admin(model_class: Type[object]) -> None:
 
         actions = [populate]
 
-    return model_class
+    return ProxyModel
 
 
-notification_receivers = {}
+notification_receivers: Dict[Type[models.Model], Callable[..., None]] = {}
+rule_classes: Dict[Type[models.Model], List[Type[BaseModelRule]]] = defaultdict(list)
+snapshot_fields: Dict[Type[models.Model], List[str]] = {}
+reminder_classes: Dict[str, Type[BaseModelReminder]] = {}
 
 
 def signal_dispatch_uid(model_class: Type[M]) -> str:
     return f"notification_receiver_{model_class.__name__}"
 
 
-def register_rule_model(rule_class: Type[M]) -> Type[M]:
+def run_rules(
+    sender: Type[M],
+    instance: M,
+    prev: Optional[M],
+    classes: List[Type[BaseModelRule]],
+) -> None:
+    changed = [
+        rule_class
+        for rule_class in classes
+        if rule_class.compare_fields(instance, prev)
+    ]
+    if not changed:
+        return
+
+    with timings.measure("rules.dispatch", model=sender._meta.label_lower):
+        for rule_class in changed:
+            rule_class.apply(instance, prev)
+
+
+def run_coalesced_rules(pending: Dict[Tuple[Type[M], Any], Dict[str, Any]]) -> None:
+    items: Dict[Type[M], List[Tuple[M, Optional[M]]]] = defaultdict(list)
+    for (sender, _), entry in pending.items():
+        items[sender].append((entry["instance"], entry["prev"]))
+
+    for sender, sender_items in items.items():
+        with timings.measure("rules.dispatch", model=sender._meta.label_lower):
+            for rule_class in rule_classes[sender]:
+                if not rule_class.coalesce_on_commit:
+                    continue
+                changed = [
+                    (instance, prev)
+                    for instance, prev in sender_items
+                    if rule_class.compare_fields(instance, prev)
+                ]
+                if changed:
+                    rule_class.apply_many(changed)
+
+
+def dispatch_rules(sender: Type[M], instance: M, **kwargs: Dict[Any, Any]) -> None:
+    """
+    Evaluates all rule classes registered for `sender` against one previous state.
+
+    Rule classes with `coalesce_on_commit` are evaluated once per instance when
+    the transaction commits, comparing the state before the first save with
+    the state after the last one.
+    """
+    prev = getattr(instance, "_pre_save_instance", None)
+    classes = rule_classes[sender]
+
+    pending = None
+    if any(rule_class.coalesce_on_commit for rule_class in classes):
+        pending = get_commit_buffers("rules", run_coalesced_rules)
+    if pending is None:
+        run_rules(sender, instance, prev, classes)
+        return
+
+    key = (sender, instance.pk)
+    # An instance saved in an enclosing savepoint keeps its first previous state
+    entry = next((buffer[key] for buffer in pending if key in buffer), None)
+    if entry is None:
+        entry = pending[-1][key] = {"prev": prev}
+    entry["instance"] = instance
+    run_rules(
+        sender,
+        instance,
+        prev,
+        [rule_class for rule_class in classes if not rule_class.coalesce_on_commit],
+    )
+
+
+def check_rule_class(rule_class: Type[R]) -> None:
+    if not rule_class.cache_rules:
+        return
+    # Cached rules are matched by `filter_rules` and never see the Q object
+    # returned by `get_condition`
+    overridden = {
+        name
+        for name in ["get_condition", "filter_rules"]
+        if getattr(rule_class, name).__func__
+        is not getattr(BaseModelRule, name).__func__
+    }
+    if overridden == {"get_condition"}:
+        raise ImproperlyConfigured(
+            f"{rule_class.__name__} overrides get_condition() with cache_rules "
+            "enabled, override filter_rules() to match cached rules in memory"
+        )
+
+
+def register_rule_model(rule_class: Type[R]) -> Type[R]:
+    check_rule_class(rule_class)
+    rule_classes[rule_class.model].append(rule_class)
+    fields = get_snapshot_fields(rule_class.model)
+    if fields is None:
+        snapshot_fields.pop(rule_class.model, None)
+    else:
+        snapshot_fields[rule_class.model] = fields
+
     pre_save.connect(
         save_previous_instance,
         rule_class.model,
         weak=False,
         dispatch_uid="save_previous_instance",
     )
+    if fields is not None:
+        for signal in [post_init, post_save]:
+            signal.connect(
+                save_instance_snapshot,
+                rule_class.model,
+                weak=False,
+                dispatch_uid="save_instance_snapshot",
+            )
+        refresh_instance_snapshot(rule_class.model)
 
-    def apply_action(
-        sender: Type[M], instance: Type[M], **kwargs: Dict[Any, Any]
-    ) -> None:
-        rule_class.invoke(instance)
-
-    notification_receivers[rule_class.model] = apply_action
+    notification_receivers[rule_class.model] = dispatch_rules
     post_save.connect(
-        apply_action,
+        dispatch_rules,
         rule_class.model,
         weak=False,
         dispatch_uid=signal_dispatch_uid(rule_class.model),
     )
 
-    register_notification_model_admin(rule_class)
+    proxy_class = register_notification_model_admin(rule_class)
+
+    if rule_class.cache_rules:
+        for sender in [rule_class, proxy_class]:
+            for signal in [post_save, post_delete]:
+                signal.connect(
+                    rule_cache.invalidate_on_commit,
+                    sender,
+                    weak=False,
+                    dispatch_uid="invalidate_rule_cache",
+                )
 
     return rule_class
 
 
-def register_reminder_model(reminder_class: Type[object]) -> Type[object]:
+def register_reminder_model(reminder_class: Type[RM]) -> Type[RM]:
+    reminder_classes[reminder_class._meta.label_lower] = reminder_class
+
+    def schedule_reminders(
+        sender: Type[M], instance: M, **kwargs: Dict[Any, Any]
+    ) -> None:
+        if reminder_class.scheduled:
+            reminder_class.schedule(instance)
+
+    post_save.connect(
+        schedule_reminders,
+        reminder_class.model,
+        weak=False,
+        dispatch_uid=f"schedule_reminders_{reminder_class._meta.label_lower}",
+    )
+
     register_notification_model_admin(reminder_class)
     return reminder_class
@@ -0,0 +1,177 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection, models, transaction
+
+from df_notifications.settings import api_settings
+
+if TYPE_CHECKING:
+    from df_notifications.models import NotificationHistory
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    """
+    Persists NotificationHistory rows, optionally as a write-behind buffer.
+
+    With `HISTORY_WRITE_BEHIND` enabled rows are kept in memory and written with
+    `bulk_create` every `HISTORY_FLUSH_SIZE` rows, every
+    `HISTORY_FLUSH_INTERVAL_MS` milliseconds and on worker shutdown. Buffered
+    notifications have no primary key until `flush()` has run.
+
+    Automatic flushes run in a background thread on its own connection, so a
+    caller's transaction that rolls back does not take the rows of other
+    callers with it. For the same reason `flush()` should only be called
+    outside of transactions.
+    """
+
+    def __init__(self) -> None:
+        self._notifications: List[Tuple["NotificationHistory", Iterable[Any]]] = []
+        self._links: List[Tuple[Any, "NotificationHistory"]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def enabled(self) -> bool:
+        return api_settings.HISTORY_WRITE_BEHIND
+
+    def write(
+        self, notification: "NotificationHistory", users: Iterable[Any]
+    ) -> "NotificationHistory":
+        if not self.enabled:
+            notification.save()
+            notification.users.set(users)
+            return notification
+        self.write_many([(notification, users)])
+        return notification
+
+    def write_many(
+        self, entries: List[Tuple["NotificationHistory", Iterable[Any]]]
+    ) -> List["NotificationHistory"]:
+        if not self.enabled:
+            return self._write(entries)
+
+        with self._lock:
+            self._notifications.extend(
+                (notification, list(users)) for notification, users in entries
+            )
+            full = len(self._notifications) >= api_settings.HISTORY_FLUSH_SIZE
+            self._schedule(now=full)
+        return [notification for notification, _ in entries]
+
+    def link(self, manager: Any, notification: "NotificationHistory") -> None:
+        """
+        Add the notification to a many-to-many manager such as `rule.history`.
+        """
+        with self._lock:
+            if notification.pk is None:
+                self._links.append((manager, notification))
+                self._schedule()
+                return
+        manager.add(notification)
+
+    def link_many(
+        self, manager: Any, notifications: List["NotificationHistory"]
+    ) -> None:
+        with self._lock:
+            if any(notification.pk is None for notification in notifications):
+                self._links.extend((manager, n) for n in notifications)
+                self._schedule()
+                return
+        manager.add(*notifications)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows. On failure they are put back into the buffer
+        for the next flush and the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer:
+                    self._timer.cancel()
+                    self._timer = None
+                notifications, self._notifications = self._notifications, []
+                links, self._links = self._links, []
+
+            try:
+                with transaction.atomic():
+                    self._write(notifications)
+                    self._write_links(links)
+            except Exception:
+                for notification, _ in notifications:
+                    notification.pk = None
+                    notification._state.adding = True
+                with self._lock:
+                    self._notifications[:0] = notifications
+                    self._links[:0] = links
+                    if self._notifications or self._links:
+                        self._schedule()
+                raise
+
+    def try_flush(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Flushes and logs errors instead of raising, for background callers.
+        """
+        try:
+            self.flush()
+        except Exception:
+            logger.exception(
+                "Failed to flush notification history, %s rows kept for retry",
+                len(self._notifications),
+            )
+
+    def _schedule(self, now: bool = False) -> None:
+        interval = 0 if now else api_settings.HISTORY_FLUSH_INTERVAL_MS
+        if now and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._timer is None and (now or interval):
+            self._timer = threading.Timer(interval / 1000, self._flush_in_thread)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_in_thread(self) -> None:
+        try:
+            self.try_flush()
+        finally:
+            connection.close()
+
+    def _write(
+        self, entries: List[Tuple["NotificationHistory", Iterable[Any]]]
+    ) -> List["NotificationHistory"]:
+        from df_notifications.models import NotificationHistory
+
+        if not entries:
+            return []
+
+        notifications = [notification for notification, _ in entries]
+        if connection.features.can_return_rows_from_bulk_insert:
+            NotificationHistory.objects.bulk_create(notifications)
+        else:
+            for notification in notifications:
+                notification.save()
+        NotificationHistory.add_users_bulk(entries)
+        return notifications
+
+    def _write_links(self, links: List[Tuple[Any, "NotificationHistory"]]) -> None:
+        rows: Dict[Any, List[models.Model]] = defaultdict(list)
+        for manager, notification in links:
+            source = manager.through._meta.get_field(manager.source_field_name)
+            target = manager.through._meta.get_field(manager.target_field_name)
+            rows[manager.through].append(
+                manager.through(
+                    **{
+                        source.attname: manager.related_val[0],
+                        target.attname: notification.pk,
+                    }
+                )
+            )
+        for through, objs in rows.items():
+            through.objects.bulk_create(objs, ignore_conflicts=True)
+
+
+history_writer = HistoryWriter()
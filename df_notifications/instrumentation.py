@@ -0,0 +1,99 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import cache
+from typing import Any, Callable, Deque, Dict, Generator, List, Tuple
+
+from django.utils.module_loading import import_string
+
+from df_notifications.settings import api_settings
+
+TimingKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+
+logger = logging.getLogger(__name__)
+
+
+@cache
+def get_hook(path: str) -> Callable[..., None]:
+    return import_string(path)
+
+
+class Timings:
+    """
+    In-memory aggregate of durations, keyed by name and tags.
+
+    Percentiles are computed from the last `TIMINGS_SAMPLE_SIZE` durations of
+    each key. Every duration is also passed to the callables listed in
+    `TIMING_HOOKS` as `hook(name, duration, **tags)`.
+    """
+
+    def __init__(self) -> None:
+        self._stats: Dict[TimingKey, Dict[str, float]] = {}
+        self._samples: Dict[TimingKey, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name: str, **tags: Any) -> Generator[None, None, None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, **tags)
+
+    def record(self, name: str, duration: float, **tags: Any) -> None:
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            stats = self._stats.setdefault(key, {"count": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += duration
+            stats["max"] = max(stats["max"], duration)
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(
+                    maxlen=api_settings.TIMINGS_SAMPLE_SIZE
+                )
+            samples.append(duration)
+
+        for path in api_settings.TIMING_HOOKS:
+            try:
+                get_hook(path)(name, duration, **tags)
+            except Exception:
+                logger.exception("Timing hook %s failed", path)
+
+    def get(self, name: str, **tags: Any) -> Dict[str, float]:
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            stats = dict(self._stats.get(key) or {})
+            samples = sorted(self._samples.get(key) or [])
+        if not stats:
+            return {"count": 0, "total": 0.0, "max": 0.0}
+        for percentile in (50, 95, 99):
+            stats[f"p{percentile}"] = get_percentile(samples, percentile)
+        return stats
+
+    def all(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": name, "tags": dict(tags), **self.get(name, **dict(tags))}
+            for name, tags in list(self._stats)
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._samples.clear()
+
+
+def get_percentile(samples: List[float], percentile: float) -> float:
+    """
+    Nearest-rank percentile of sorted samples.
+    """
+    if not samples:
+        return 0.0
+    rank = math.ceil(percentile / 100 * len(samples))
+    return samples[min(max(rank, 1), len(samples)) - 1]
+
+
+timings = Timings()
@@ -0,0 +1,32 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from df_notifications.decorators import reminder_classes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate ReminderState rows from the notification history of reminders, "
+        "e.g. for reminders that were sent before the state table existed."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "reminders",
+            nargs="*",
+            help="Reminder model labels such as app.modelreminder, all by default",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        labels = [label.lower() for label in options["reminders"]]
+        unknown = set(labels) - set(reminder_classes)
+        if unknown:
+            raise CommandError(f"Unknown reminders: {', '.join(sorted(unknown))}")
+
+        for label in labels or reminder_classes:
+            model = reminder_classes[label]
+            if not hasattr(model, "rebuild_state"):
+                continue
+            model.rebuild_state()
+            self.stdout.write(f"Rebuilt reminder state of {label}")
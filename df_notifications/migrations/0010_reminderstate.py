@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("df_notifications", "0009_alter_notificationhistory_instance_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReminderState",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("reminder_id", models.CharField(max_length=255)),
+                ("instance_id", models.CharField(max_length=255)),
+                ("sent_count", models.PositiveIntegerField(default=0)),
+                ("last_sent_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["content_type", "reminder_id", "last_sent_at"],
+                        name="df_notifica_content_2d429c_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("content_type", "reminder_id", "instance_id"),
+                        name="df_notifications_reminder_state_unique",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("df_notifications", "0010_reminderstate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reminderstate",
+            name="due_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="reminderstate",
+            index=models.Index(
+                fields=["content_type", "reminder_id", "due_at"],
+                name="df_notifica_content_acf8ce_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("df_notifications", "0011_reminderstate_due_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReminderWatermark",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("reminder_id", models.CharField(max_length=255)),
+                ("scanned_at", models.DateTimeField()),
+                ("reconciled_at", models.DateTimeField()),
+                (
+                    "content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("content_type", "reminder_id"),
+                        name="df_notifications_reminder_watermark_unique",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,6 +1,10 @@
 import json
-from datetime import timedelta
-from functools import cache
+import logging
+from collections import defaultdict
+from copy import copy
+from datetime import datetime, timedelta
+from functools import cache, lru_cache
+from types import CodeType
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -9,6 +13,7 @@ from typing import (
     Iterable,
     List,
     Optional,
+    Tuple,
     Type,
     TypeVar,
     Union,
@@ -22,9 +27,22 @@ from django.contrib.contenttypes.fields import (
     GenericRelation,
 )
 from django.contrib.contenttypes.models import ContentType
-from django.db import models, transaction
-from django.db.models import Count, Q, QuerySet
-from django.template.loader import render_to_string
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    QuerySet,
+    When,
+)
+from django.db.models.functions import Cast
+from django.template.loader import select_template
 from django.utils import timezone
 from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
@@ -32,10 +50,16 @@ from fcm_django.models import AbstractFCMDevice
 
 from df_notifications.channels import BaseChannel, FirebasePushChannel
 from df_notifications.fields import NoMigrationsChoicesField
+from df_notifications.history import history_writer
+from df_notifications.instrumentation import timings
+from df_notifications.rule_cache import rule_cache
 from df_notifications.settings import api_settings
+from df_notifications.template_cache import get_template_names, template_cache
+from df_notifications.utils import get_commit_buffers
 
 M = TypeVar("M", bound=models.Model)
 
+logger = logging.getLogger(__name__)
 
 # https://code.djangoproject.com/ticket/33174
 if TYPE_CHECKING:
@@ -55,34 +79,123 @@ def get_channel_instance(channel: "NotificationModelMixin") -> BaseChannel:
     return import_string(api_settings.CHANNELS[channel])()  # type: ignore
 
 
+def render_parts(
+    channel: str, template_prefixes: List[str], context: Dict[str, Any]
+) -> Dict[str, str]:
+    parts = {}
+    for part in get_channel_instance(channel).template_parts:
+        with timings.measure(
+            "notifications.render",
+            channel=channel,
+            template_prefix=template_prefixes[0],
+            part=part,
+        ):
+            if api_settings.TEMPLATE_CACHE:
+                template = template_cache.get(channel, template_prefixes, part)
+            else:
+                template = select_template(
+                    get_template_names(channel, template_prefixes, part)
+                )
+            parts[part] = template.render(context).strip()
+    return parts
+
+
 def send_notification(
     users: type[Iterable[Any]],
     channel: str,
     template_prefixes: Union[List[str], str],
     context: Dict[str, Any],
+    parts: Optional[Dict[str, str]] = None,
 ) -> "NotificationHistory":
     if isinstance(template_prefixes, str):
         template_prefixes = [template_prefixes]
 
     channel_instance = get_channel_instance(channel)
-    parts = {}
-    for part in channel_instance.template_parts:
-        templates = []
-        for prefix in template_prefixes:
-            templates.append(f"{prefix}{channel}__{part}")
-            templates.append(f"{prefix}{part}")
-        parts[part] = render_to_string(templates, context=context).strip()
+    if parts is None:
+        parts = render_parts(channel, template_prefixes, context)
 
-    channel_instance.send(users, {**context, **parts})  # type: ignore
+    tags = {"channel": channel, "template_prefix": template_prefixes[0]}
+    with timings.measure("notifications.send", **tags):
+        channel_instance.send(users, {**context, **parts})  # type: ignore
 
-    notification = NotificationHistory.objects.create(
+    with timings.measure("notifications.history", **tags):
+        return history_writer.write(
+            build_history(channel, template_prefixes, parts, context),
+            users,  # type: ignore
+        )
+
+
+def build_history(
+    channel: str,
+    template_prefixes: List[str],
+    parts: Dict[str, str],
+    context: Dict[str, Any],
+) -> "NotificationHistory":
+    return NotificationHistory(
         channel=channel,
         template_prefix=template_prefixes[0],
         content=parts if api_settings.SAVE_HISTORY_CONTENT else "",
         instance=context.get("instance"),
     )
-    notification.users.set(users)
-    return notification
+
+
+def get_context_key(context: Dict[str, Any]) -> str:
+    def default(value: Any) -> str:
+        if isinstance(value, models.Model) and value.pk is not None:
+            return f"{value._meta.label_lower}:{value.pk}"
+        return f"{type(value).__qualname__}:{id(value)}"
+
+    return json.dumps(context, sort_keys=True, default=default)
+
+
+def send_notifications_bulk(
+    items: Iterable[Tuple[Iterable[Any], Dict[str, Any]]],
+    channel: str,
+    template_prefixes: Union[List[str], str],
+) -> List[Optional["NotificationHistory"]]:
+    """
+    Send many (users, context) pairs through the same channel and templates.
+
+    Identical contexts are rendered once, the channel receives all messages in
+    a single `send_batch` call and history is written with `bulk_create`.
+    Returns the history of each pair in order, or None where delivery failed.
+    """
+    if isinstance(template_prefixes, str):
+        template_prefixes = [template_prefixes]
+
+    rendered: Dict[str, Dict[str, str]] = {}
+    messages = []
+    for users, context in items:
+        key = get_context_key(context)
+        if key not in rendered:
+            rendered[key] = render_parts(channel, template_prefixes, context)
+        messages.append((users, context, rendered[key]))
+
+    tags = {"channel": channel, "template_prefix": template_prefixes[0]}
+    with timings.measure("notifications.send", **tags):
+        results = get_channel_instance(channel).send_batch(
+            [(users, {**context, **parts}) for users, context, parts in messages]
+        )
+
+    notifications: List[Optional[NotificationHistory]] = []
+    entries = []
+    for (users, context, parts), result in zip(messages, results):
+        if isinstance(result, Exception):
+            logger.error(
+                "Failed to send %s notification %s: %r",
+                channel,
+                template_prefixes[0],
+                result,
+            )
+            notifications.append(None)
+            continue
+        notification = build_history(channel, template_prefixes, parts, context)
+        notifications.append(notification)
+        entries.append((notification, users))
+
+    with timings.measure("notifications.history", **tags):
+        history_writer.write_many(entries)
+    return notifications
 
 
 class UserDevice(AbstractFCMDevice):
@@ -169,6 +282,28 @@ class NotificationHistory(models.Model):
             models.Index(fields=["content_type", "instance_id", "created"]),
         ]
 
+    @classmethod
+    def add_users_bulk(
+        cls, notifications: Iterable[Tuple["NotificationHistory", Iterable[Any]]]
+    ) -> None:
+        field = cls.users.field
+        Through = cls.users.through
+        Through.objects.bulk_create(
+            [
+                Through(
+                    **{
+                        f"{field.m2m_field_name()}_id": notification.pk,
+                        f"{field.m2m_reverse_field_name()}_id": getattr(
+                            user, "pk", user
+                        ),
+                    }
+                )
+                for notification, users in notifications
+                for user in users
+            ],
+            ignore_conflicts=True,
+        )
+
     def resend(self) -> None:
         get_channel_instance(self.channel).send(self.users.all(), self.content)
 
@@ -180,12 +315,138 @@ class NotifiableModelMixin(models.Model):
         abstract = True
 
 
+class ReminderStateQuerySet(models.QuerySet):
+    def for_reminder(self, reminder: models.Model) -> models.QuerySet:
+        return self.filter(
+            content_type=ContentType.objects.get_for_model(reminder),
+            reminder_id=str(reminder.pk),
+        )
+
+    def record_sent(self, reminder: models.Model, instance_ids: Iterable[Any]) -> None:
+        instance_ids = [str(instance_id) for instance_id in instance_ids]
+        content_type = ContentType.objects.get_for_model(reminder)
+        ReminderState.objects.bulk_create(
+            [
+                ReminderState(
+                    content_type=content_type,
+                    reminder_id=str(reminder.pk),
+                    instance_id=instance_id,
+                )
+                for instance_id in instance_ids
+            ],
+            ignore_conflicts=True,
+        )
+        self.for_reminder(reminder).filter(instance_id__in=instance_ids).update(
+            sent_count=F("sent_count") + 1, last_sent_at=timezone.now()
+        )
+
+
+class ReminderState(models.Model):
+    """
+    How many times and when a reminder was last sent for a model instance.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    reminder_id = models.CharField(max_length=255)
+    instance_id = models.CharField(max_length=255)
+    sent_count = models.PositiveIntegerField(default=0)
+    last_sent_at = models.DateTimeField(null=True, blank=True)
+    due_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ReminderStateQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "reminder_id", "instance_id"],
+                name="df_notifications_reminder_state_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["content_type", "reminder_id", "last_sent_at"]),
+            models.Index(fields=["content_type", "reminder_id", "due_at"]),
+        ]
+
+
+class ReminderWatermarkQuerySet(models.QuerySet):
+    def for_reminder(self, reminder: models.Model) -> models.QuerySet:
+        return self.filter(
+            content_type=ContentType.objects.get_for_model(reminder),
+            reminder_id=str(reminder.pk),
+        )
+
+
+class ReminderWatermark(models.Model):
+    """
+    When an incremental reminder last scanned and last fully reconciled.
+    """
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    reminder_id = models.CharField(max_length=255)
+    scanned_at = models.DateTimeField()
+    reconciled_at = models.DateTimeField()
+
+    objects = ReminderWatermarkQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "reminder_id"],
+                name="df_notifications_reminder_watermark_unique",
+            ),
+        ]
+
+
 # ----------- Actions -------------
 
 
+class ModelSnapshot:
+    """
+    Lightweight stand-in for the previous state of an instance.
+
+    Holds the primary key and the tracked field values captured when the
+    instance was loaded, so rules can compare against it without a query.
+    """
+
+    def __init__(self, pk: Any, values: Dict[str, Any]) -> None:
+        self.pk = pk
+        self.__dict__.update(values)
+
+    @classmethod
+    def capture(cls, instance: M, fields: List[str]) -> Optional["ModelSnapshot"]:
+        values = instance.__dict__
+        if any(field not in values for field in fields):
+            # Deferred fields would trigger a query, fall back to a fetch
+            return None
+        return cls(instance.pk, {field: copy(values[field]) for field in fields})
+
+
 class BaseModelRule(GenericBase[M], models.Model):
     model: Type[M]
     tracking_fields: Optional[List[str]] = None
+    # Set when `get_queryset`/`check_condition` read fields of `prev` outside
+    # of `tracking_fields`; the previous row is then fetched on every save.
+    requires_previous_instance = False
+    # Compare against the `tracking_fields` values captured when the instance
+    # was loaded instead of fetching the row before every save. `prev` is then
+    # the loaded state, not the row in the database. Only used when every rule
+    # class of the model sets it.
+    snapshot_on_load = False
+    # Keep rule rows in memory and match them with `filter_rules` instead of
+    # running `get_queryset` on every save. A rule class that overrides
+    # `get_condition` must also override `filter_rules` to match in memory.
+    cache_rules = False
+    # Maps a tracked model field to the (previous, next) value fields of the
+    # rule, e.g. {"is_published": ("is_published_prev", "is_published_next")}.
+    # A previous value of None on the rule matches any previous value.
+    transitions: Optional[Dict[str, Tuple[str, str]]] = None
+    # Evaluate once per instance at transaction commit instead of on every save
+    coalesce_on_commit = False
+    # Maps rule fields to model fields that must be equal, e.g.
+    # {"category": "category"}. Matched in the database by `get_queryset`
+    # and in memory for cached rules.
+    condition_fields: Optional[Dict[str, str]] = None
 
     @classmethod
     def compare_fields(cls, instance: M, prev: Optional[M]) -> bool:
@@ -198,9 +459,57 @@ class BaseModelRule(GenericBase[M], models.Model):
 
         return False
 
+    @classmethod
+    def get_condition(cls, instance: M, prev: Optional[M]) -> Q:
+        """
+        Filter of the rule rows matching the instance, applied in the database.
+        Not used for cached rules, see `filter_rules`.
+        """
+        return Q(
+            **{
+                rule_field: getattr(instance, model_field)
+                for rule_field, model_field in (cls.condition_fields or {}).items()
+            }
+        )
+
     @classmethod
     def get_queryset(cls, instance: M, prev: Optional[M]) -> QuerySet["BaseModelRule"]:
-        return cls.objects.all()
+        qs = cls.objects.filter(cls.get_condition(instance, prev))
+        for field, (prev_field, next_field) in (cls.transitions or {}).items():
+            qs = qs.filter(**{next_field: getattr(instance, field)})
+            if prev is not None:
+                qs = qs.filter(
+                    Q(**{f"{prev_field}__isnull": True})
+                    | Q(**{prev_field: getattr(prev, field)})
+                )
+        return qs
+
+    @classmethod
+    def filter_rules(
+        cls, rules: List["BaseModelRule"], instance: M, prev: Optional[M]
+    ) -> Iterable["BaseModelRule"]:
+        """
+        Matches cached rule rows against `condition_fields` in memory.
+        """
+        conditions = [
+            (rule_field, getattr(instance, model_field))
+            for rule_field, model_field in (cls.condition_fields or {}).items()
+        ]
+        return [
+            rule
+            for rule in rules
+            if all(getattr(rule, field) == value for field, value in conditions)
+        ]
+
+    @classmethod
+    def get_rules(cls, instance: M, prev: Optional[M]) -> Iterable["BaseModelRule"]:
+        if cls.cache_rules:
+            if cls.transitions:
+                rules = rule_cache.get_index(cls).match(instance, prev)
+            else:
+                rules = rule_cache.get(cls)
+            return cls.filter_rules(rules, instance, prev)
+        return cls.get_queryset(instance, prev)
 
     def check_condition(self, instance: M, prev: Optional[M]) -> bool:
         return True
@@ -208,6 +517,21 @@ class BaseModelRule(GenericBase[M], models.Model):
     def perform_action(self, instance: M) -> None:
         pass
 
+    @classmethod
+    def apply(cls, instance: M, prev: Optional[M]) -> None:
+        for action in cls.get_rules(instance, prev):
+            if action.check_condition(instance, prev):
+                action.perform_action(instance)
+
+    @classmethod
+    def apply_many(cls, items: List[Tuple[M, Optional[M]]]) -> None:
+        """
+        Applies the rules to many (instance, previous instance) pairs, e.g.
+        the instances saved in one transaction.
+        """
+        for instance, prev in items:
+            cls.apply(instance, prev)
+
     @classmethod
     def invoke(cls, instance: M) -> None:
         prev = getattr(instance, "_pre_save_instance", None)
@@ -215,9 +539,7 @@ class BaseModelRule(GenericBase[M], models.Model):
         if not cls.compare_fields(instance, prev):
             return
 
-        for action in cls.get_queryset(instance, prev):
-            if action.check_condition(instance, prev):
-                action.perform_action(instance)
+        cls.apply(instance, prev)
 
     class Meta:
         abstract = True
@@ -225,13 +547,36 @@ class BaseModelRule(GenericBase[M], models.Model):
 
 class BaseModelReminder(GenericBase[M], models.Model):
     model: Type[M]
+    # Process candidates in primary key buckets of this size, each in its own task
+    chunk_size: Optional[int] = None
+    # Seconds between periodic checks, defaults to REMINDERS_CHECK_PERIOD
+    check_period: Optional[float] = None
+    # Maps reminder fields to model lookups, e.g. {"is_published": "is_published"},
+    # so that admin-editable fields filter candidates in the database
+    condition_fields: Optional[Dict[str, str]] = None
+
+    @classmethod
+    def get_check_period(cls) -> float:
+        return cls.check_period or api_settings.REMINDERS_CHECK_PERIOD
 
     @classmethod
     def get_queryset(cls) -> QuerySet["BaseModelReminder"]:
         return cls.objects.all()
 
+    def get_condition(self) -> Q:
+        """
+        Filter of the candidate instances, applied in the database. Use
+        `check_condition` only for what cannot be expressed as a query.
+        """
+        return Q(
+            **{
+                lookup: getattr(self, field)
+                for field, lookup in (self.condition_fields or {}).items()
+            }
+        )
+
     def get_model_queryset(self) -> QuerySet[M]:
-        return self.model.objects.all()
+        return self.model.objects.filter(self.get_condition())
 
     def check_condition(self, instance: M) -> bool:
         return True
@@ -239,12 +584,35 @@ class BaseModelReminder(GenericBase[M], models.Model):
     def perform_action(self, instance: M) -> None:
         pass
 
+    def perform_actions(self, instances: List[M]) -> int:
+        """
+        Performs the action for every instance and returns how many succeeded.
+        """
+        for instance in instances:
+            self.perform_action(instance)
+        return len(instances)
+
+    def process(self, instances: Iterable[M]) -> int:
+        """
+        Performs the action for matching instances in batches of
+        `REMINDERS_BATCH_SIZE`.
+        """
+        sent = 0
+        batch: List[M] = []
+        for instance in instances:
+            if self.check_condition(instance):
+                batch.append(instance)
+            if len(batch) >= api_settings.REMINDERS_BATCH_SIZE:
+                sent += self.perform_actions(batch)
+                batch = []
+        if batch:
+            sent += self.perform_actions(batch)
+        return sent
+
     @classmethod
     def invoke(cls) -> None:
         for reminder in cls.get_queryset():
-            for instance in reminder.get_model_queryset():
-                if reminder.check_condition(instance):
-                    reminder.perform_action(instance)
+            reminder.process(reminder.get_model_queryset())
 
     class Meta:
         abstract = True
@@ -266,15 +634,20 @@ class NotificationModelMixin(models.Model):
         return []
 
     def get_context(self, instance: M) -> Dict[str, Any]:
-        context = {
-            "instance": instance,
-        }
-        for context_processor in api_settings.CONTEXT_PROCESSORS:
-            context.update(import_string(context_processor)(instance))
-        return {
-            **context,
-            **self.context,
-        }
+        with timings.measure(
+            "notifications.context",
+            channel=self.channel,
+            template_prefix=self.template_prefix,
+        ):
+            context = {
+                "instance": instance,
+            }
+            for context_processor in api_settings.CONTEXT_PROCESSORS:
+                context.update(import_string(context_processor)(instance))
+            return {
+                **context,
+                **self.context,
+            }
 
     def get_template_prefixes(self) -> list:
         return [
@@ -289,36 +662,127 @@ class NotificationModelMixin(models.Model):
             self.get_template_prefixes(),
             self.get_context(instance),
         )
-        self.history.add(notification)
+        history_writer.link(self.history, notification)
+
+    def send_many(self, instances: List[M]) -> List[M]:
+        """
+        Sends to every instance and returns the instances that were delivered.
+        """
+        if type(self).send is not NotificationModelMixin.send:
+            return send_each(self, instances)
+        notifications = send_notifications_bulk(
+            [
+                (self.get_users(instance), self.get_context(instance))
+                for instance in instances
+            ],
+            self.channel,
+            self.get_template_prefixes(),
+        )
+        history_writer.link_many(
+            self.history, [n for n in notifications if n is not None]
+        )
+        return [
+            instance
+            for instance, notification in zip(instances, notifications)
+            if notification is not None
+        ]
 
     class Meta:
         abstract = True
 
 
+def send_each(notification: Any, instances: List[M]) -> List[M]:
+    """
+    Calls an overridden `send` for every instance and returns the instances
+    it did not fail for.
+    """
+    sent = []
+    for instance in instances:
+        try:
+            notification.send(instance)
+        except Exception:
+            logger.exception(
+                "Failed to send %s %s for %s",
+                notification._meta.label_lower,
+                notification.pk,
+                instance.pk,
+            )
+        else:
+            sent.append(instance)
+    return sent
+
+
+def send_async_notifications(notifications: List[List[str]]) -> None:
+    batch_size = api_settings.ASYNC_NOTIFICATIONS_BATCH_SIZE
+    for i in range(0, len(notifications), batch_size):
+        app.send_task(
+            "df_notifications.tasks.send_model_notifications_batch_task",
+            args=[notifications[i : i + batch_size]],
+        )
+
+
 class AsyncNotificationMixin:
     def send(self, instance: M) -> None:
-        transaction.on_commit(
-            lambda: app.send_task(
-                "df_notifications.tasks.send_model_notification_task",
-                args=[
-                    self._meta.label_lower,
-                    str(self.pk),
-                    str(instance.pk),
-                ],
-            )
+        self.queue_notifications([instance])
+
+    def send_many(self, instances: List[M]) -> List[M]:
+        if type(self).send is not AsyncNotificationMixin.send:
+            return send_each(self, instances)
+        self.queue_notifications(instances)
+        return instances
+
+    def queue_notifications(self, instances: List[M]) -> None:
+        label = self._meta.label_lower
+        notifications = [[label, str(self.pk), str(i.pk)] for i in instances]
+        # Notifications queued in one transaction are published in batches
+        pending = get_commit_buffers(
+            "async_notifications", send_async_notifications, list
         )
+        if pending is None:
+            send_async_notifications(notifications)
+        else:
+            pending[-1].extend(notifications)
 
 
 class NotificationModelRule(NotificationModelMixin, BaseModelRule):
     def perform_action(self, instance: M) -> None:
         self.send(instance)
 
+    @classmethod
+    def apply_many(cls, items: List[Tuple[M, Optional[M]]]) -> None:
+        if cls.perform_action is not NotificationModelRule.perform_action:
+            # Honour an overridden perform_action
+            super().apply_many(items)
+            return
+
+        # Each rule sends to all of its matching instances in one batch
+        matches: Dict[Any, Tuple[Any, List[M]]] = {}
+        for instance, prev in items:
+            for rule in cls.get_rules(instance, prev):
+                if rule.check_condition(instance, prev):
+                    matches.setdefault(rule.pk, (rule, []))[1].append(instance)
+        for rule, instances in matches.values():
+            rule.send_many(instances)
+
     class Meta:
         abstract = True
 
 
+@lru_cache(maxsize=256)
+def compile_action(source: str) -> CodeType:
+    return compile(source, "<reminder action>", "exec")
+
+
 class NotificationModelReminder(NotificationModelMixin, BaseModelReminder):
     MODIFIED_MODEL_FIELD = "modified"
+    # Keep a due time per instance in ReminderState and only process due rows
+    # instead of scanning the whole model queryset on every run.
+    scheduled = False
+    # Only scan instances whose delay or cooldown expired since the previous
+    # run, with a full scan every `reconcile_period` as a safety net.
+    # MODIFIED_MODEL_FIELD should be indexed.
+    incremental = False
+    reconcile_period = timedelta(hours=1)
 
     delay = models.DurationField(
         help_text="Send the reminder after this period of time",
@@ -339,21 +803,15 @@ class NotificationModelReminder(NotificationModelMixin, BaseModelReminder):
     )
 
     def get_model_queryset(self) -> QuerySet[M]:
+        exhausted = ReminderState.objects.for_reminder(self).filter(
+            Q(sent_count__gte=self.repeat)
+            | Q(last_sent_at__gt=timezone.now() - self.cooldown),
+            instance_id=Cast(OuterRef("pk"), models.CharField()),
+        )
         qs = (
             super(NotificationModelReminder, self)
             .get_model_queryset()
-            .annotate(
-                notification_count=Count(
-                    "notifications__id",
-                    filter=Q(notifications__in=self.history.all()),
-                ),
-            )
-            .filter(Q(notification_count__lt=self.repeat))
-            .exclude(
-                Q(notifications__in=self.history.all())
-                & Q(notifications__created__gt=(timezone.now() - self.cooldown))
-            )
-            .distinct()
+            .filter(~Exists(exhausted))
         )
         if self.MODIFIED_MODEL_FIELD:
             qs = qs.filter(
@@ -362,9 +820,265 @@ class NotificationModelReminder(NotificationModelMixin, BaseModelReminder):
         return qs
 
     def perform_action(self, instance: M) -> None:
-        self.send(instance)
+        self.remind([instance])
+
+    def perform_actions(self, instances: List[M]) -> int:
+        if type(self).perform_action is not NotificationModelReminder.perform_action:
+            # Honour an overridden perform_action
+            return super().perform_actions(instances)
+        return len(self.remind(instances))
+
+    def remind(self, instances: List[M]) -> List[M]:
+        """
+        Sends the reminder, runs the action for every delivered instance and
+        records them as sent. Returns the delivered instances.
+        """
+        # Instances that failed are left for the next run
+        instances = self.send_many(instances)
+        if not instances:
+            return []
         if self.action:
-            exec(self.action)
+            code = compile_action(self.action)
+            label = self._meta.label_lower
+            instance: M
+            for instance in instances:
+                try:
+                    with timings.measure(
+                        "reminders.action", reminder=label, pk=self.pk
+                    ):
+                        exec(code)
+                except Exception:
+                    logger.exception(
+                        "Action of reminder %s %s failed for %s",
+                        label,
+                        self.pk,
+                        instance.pk,
+                    )
+        instance_ids = [instance.pk for instance in instances]
+        ReminderState.objects.record_sent(self, instance_ids)
+        if self.scheduled:
+            self.reschedule(instance_ids)
+        return instances
+
+    def clean(self) -> None:
+        super().clean()
+        try:
+            compile_action(self.action)
+        except SyntaxError as e:
+            raise ValidationError({"action": f"{e.msg} (line {e.lineno})"}) from e
+
+    @classmethod
+    def invoke(cls) -> None:
+        if cls.scheduled:
+            for reminder in cls.get_queryset():
+                reminder.process_due()
+        elif cls.incremental:
+            for reminder in cls.get_queryset():
+                reminder.process_incremental()
+        else:
+            super().invoke()
+
+    def process_incremental(self) -> None:
+        """
+        Processes instances that crossed the delay threshold or whose cooldown
+        expired since the previous run.
+        """
+        now = timezone.now()
+        watermark = ReminderWatermark.objects.for_reminder(self).first()
+        if (
+            watermark is None
+            or not self.MODIFIED_MODEL_FIELD
+            or watermark.reconciled_at <= now - self.reconcile_period
+        ):
+            self.process(self.get_model_queryset())
+            ReminderWatermark.objects.update_or_create(
+                content_type=ContentType.objects.get_for_model(self),
+                reminder_id=str(self.pk),
+                defaults={"scanned_at": now, "reconciled_at": now},
+            )
+            return
+
+        since = watermark.scanned_at
+        field = self.MODIFIED_MODEL_FIELD
+        self.process(
+            self.get_model_queryset().filter(
+                **{
+                    f"{field}__gte": since - self.delay,
+                    f"{field}__lt": now - self.delay,
+                }
+            )
+        )
+        cooled_down = ReminderState.objects.for_reminder(self).filter(
+            sent_count__lt=self.repeat,
+            last_sent_at__gte=since - self.cooldown,
+            last_sent_at__lt=now - self.cooldown,
+        )
+        self.process(
+            self.get_model_queryset().filter(
+                pk__in=list(cooled_down.values_list("instance_id", flat=True))
+            )
+        )
+        ReminderWatermark.objects.filter(pk=watermark.pk).update(scanned_at=now)
+
+    def process_due(self) -> None:
+        """
+        Processes instances whose due time has passed, earliest first.
+        """
+        batch_size = api_settings.REMINDERS_BATCH_SIZE
+        retry_delay = timedelta(seconds=self.get_check_period())
+        while True:
+            due_ids = list(
+                ReminderState.objects.for_reminder(self)
+                .filter(due_at__lt=timezone.now())
+                .order_by("due_at")
+                .values_list("instance_id", flat=True)[:batch_size]
+            )
+            if not due_ids:
+                return
+
+            instances: List[Any] = list(
+                filter(
+                    self.check_condition,
+                    self.get_model_queryset().filter(pk__in=due_ids),
+                )
+            )
+            if instances:
+                self.perform_actions(instances)
+            performed = {str(instance.pk) for instance in instances}
+            # Instances that failed are still due, retry them on a later check
+            now = timezone.now()
+            ReminderState.objects.for_reminder(self).filter(
+                instance_id__in=performed, due_at__lt=now
+            ).update(due_at=now + retry_delay)
+            self.reschedule([pk for pk in due_ids if pk not in performed])
+
+    def reschedule(self, instance_ids: Iterable[Any]) -> None:
+        """
+        Moves the due time of instances to the end of their cooldown, or clears
+        it when the reminder is exhausted until the instance is modified again.
+        """
+        now = timezone.now()
+        ReminderState.objects.for_reminder(self).filter(
+            instance_id__in=[str(instance_id) for instance_id in instance_ids]
+        ).update(
+            due_at=Case(
+                When(
+                    Q(sent_count__lt=self.repeat)
+                    & Q(last_sent_at__gt=now - self.cooldown),
+                    then=F("last_sent_at") + self.cooldown,
+                ),
+                default=None,
+            )
+        )
+
+    @classmethod
+    def schedule(cls, instance: M) -> None:
+        """
+        Sets the due time of every reminder of this class for a modified instance.
+        """
+        if cls.MODIFIED_MODEL_FIELD:
+            modified = getattr(instance, cls.MODIFIED_MODEL_FIELD)
+        else:
+            modified = timezone.now()
+
+        reminders = list(cls.objects.values_list("pk", "delay"))
+        ReminderState.objects.bulk_create(
+            [
+                ReminderState(
+                    content_type=ContentType.objects.get_for_model(cls),
+                    reminder_id=str(pk),
+                    instance_id=str(instance.pk),
+                )
+                for pk, _ in reminders
+            ],
+            ignore_conflicts=True,
+        )
+        by_delay = defaultdict(list)
+        for pk, delay in reminders:
+            by_delay[delay].append(str(pk))
+        for delay, pks in by_delay.items():
+            ReminderState.objects.filter(
+                content_type=ContentType.objects.get_for_model(cls),
+                reminder_id__in=pks,
+                instance_id=str(instance.pk),
+            ).update(due_at=modified + delay)
+
+    @classmethod
+    def get_next_due_at(cls) -> Optional[datetime]:
+        return ReminderState.objects.filter(
+            content_type=ContentType.objects.get_for_model(cls),
+            reminder_id__in=[
+                str(pk) for pk in cls.objects.values_list("pk", flat=True)
+            ],
+        ).aggregate(next_due_at=Min("due_at"))["next_due_at"]
+
+    @classmethod
+    def rebuild_schedule(cls) -> None:
+        """
+        Marks every currently eligible instance as due, e.g. after enabling
+        `scheduled` on a reminder class with existing data.
+        """
+        now = timezone.now()
+        content_type = ContentType.objects.get_for_model(cls)
+        for reminder in cls.objects.all():
+            instance_ids = [
+                str(pk)
+                for pk in reminder.get_model_queryset().values_list("pk", flat=True)
+            ]
+            ReminderState.objects.bulk_create(
+                [
+                    ReminderState(
+                        content_type=content_type,
+                        reminder_id=str(reminder.pk),
+                        instance_id=instance_id,
+                    )
+                    for instance_id in instance_ids
+                ],
+                ignore_conflicts=True,
+            )
+            ReminderState.objects.for_reminder(reminder).filter(
+                instance_id__in=instance_ids
+            ).update(due_at=now)
+
+    @classmethod
+    def backfill_state(cls) -> bool:
+        """
+        Rebuilds the state of reminders that have notification history but no
+        ReminderState rows yet, so that upgrading does not send them again.
+        """
+        content_type = ContentType.objects.get_for_model(cls)
+        if ReminderState.objects.filter(content_type=content_type).exists():
+            return False
+        if not cls.history.through.objects.exists():
+            return False
+        cls.rebuild_state()
+        return True
+
+    @classmethod
+    def rebuild_state(cls) -> None:
+        """
+        Recreates ReminderState rows from the reminders' notification history,
+        e.g. for reminders that were sent before the state table existed.
+        """
+        content_type = ContentType.objects.get_for_model(cls)
+        for reminder in cls.objects.all():
+            rows = (
+                reminder.history.values("instance_id")
+                .annotate(sent_count=Count("id"), last_sent_at=Max("created"))
+                .order_by()
+            )
+            ReminderState.objects.for_reminder(reminder).delete()
+            ReminderState.objects.bulk_create(
+                [
+                    ReminderState(
+                        content_type=content_type,
+                        reminder_id=str(reminder.pk),
+                        **row,
+                    )
+                    for row in rows
+                    if row["instance_id"] is not None
+                ]
+            )
 
     class Meta:
         abstract = True
@@ -411,12 +1125,14 @@ class CustomPushMessage(models.Model):
         }
         audience = self.audience.all()
         FirebasePushChannel().send(audience or User.objects.all(), context)
-        notification = NotificationHistory.objects.create(
-            channel="push",
-            template_prefix="",
-            content=context,
-            instance=self,
+        history_writer.write(
+            NotificationHistory(
+                channel="push",
+                template_prefix="",
+                content=context,
+                instance=self,
+            ),
+            audience,
         )
-        notification.users.set(self.audience.all())
         self.sent = timezone.now()
         self.save()
@@ -0,0 +1,128 @@
+import threading
+import uuid
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type
+
+from django.core.cache import cache
+from django.db import transaction
+
+if TYPE_CHECKING:
+    from df_notifications.models import BaseModelRule
+
+
+ANY = object()
+
+
+class TransitionIndex:
+    """
+    Rules grouped by the (field, previous value, next value) transitions they match.
+
+    A rule whose previous value field is None matches any previous value.
+    """
+
+    def __init__(
+        self, rules: List[Any], transitions: Dict[str, Tuple[str, str]]
+    ) -> None:
+        self.transitions = transitions
+        self.positions = {id(rule): position for position, rule in enumerate(rules)}
+        self.by_transition: Dict[Tuple[str, Any, Any], List[Any]] = defaultdict(list)
+        self.by_next: Dict[Tuple[str, Any], List[Any]] = defaultdict(list)
+
+        for rule in rules:
+            for field, (prev_field, next_field) in transitions.items():
+                prev_value = getattr(rule, prev_field)
+                next_value = getattr(rule, next_field)
+                self.by_next[(field, next_value)].append(rule)
+                self.by_transition[
+                    (field, ANY if prev_value is None else prev_value, next_value)
+                ].append(rule)
+
+    def match(self, instance: Any, prev: Optional[Any]) -> List[Any]:
+        matched: Optional[Dict[int, Any]] = None
+        for field in self.transitions:
+            value = getattr(instance, field)
+            if prev is None:
+                candidates = self.by_next.get((field, value), [])
+            else:
+                candidates = [
+                    *self.by_transition.get((field, getattr(prev, field), value), []),
+                    *self.by_transition.get((field, ANY, value), []),
+                ]
+
+            found = {id(rule): rule for rule in candidates}
+            if matched is not None:
+                found = {key: rule for key, rule in found.items() if key in matched}
+            if not found:
+                return []
+            matched = found
+
+        return sorted((matched or {}).values(), key=lambda r: self.positions[id(r)])
+
+
+class RuleCache:
+    """
+    Process-local cache of rule rows, one list per rule class.
+
+    Each rule class has a version token in Django's cache framework. Saving or
+    deleting a rule replaces the token, which makes every other process reload
+    its list on the next lookup.
+    """
+
+    def __init__(self) -> None:
+        self._rules: Dict[
+            Type["BaseModelRule"], Tuple[Optional[str], Dict[str, Any]]
+        ] = {}
+        self._lock = threading.Lock()
+
+    def get_version_key(self, rule_class: Type["BaseModelRule"]) -> str:
+        return f"df_notifications:rules:{rule_class._meta.label_lower}"
+
+    def get_version(self, rule_class: Type["BaseModelRule"]) -> Optional[str]:
+        key = self.get_version_key(rule_class)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, None)
+            version = cache.get(key)
+        return version
+
+    def _get_entry(self, rule_class: Type["BaseModelRule"]) -> Dict[str, Any]:
+        version = self.get_version(rule_class)
+        cached = self._rules.get(rule_class)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        entry: Dict[str, Any] = {"rules": list(rule_class.objects.all())}
+        with self._lock:
+            self._rules[rule_class] = (version, entry)
+        return entry
+
+    def get(self, rule_class: Type["BaseModelRule"]) -> List["BaseModelRule"]:
+        return self._get_entry(rule_class)["rules"]
+
+    def get_index(self, rule_class: Type["BaseModelRule"]) -> TransitionIndex:
+        entry = self._get_entry(rule_class)
+        if "index" not in entry:
+            entry["index"] = TransitionIndex(
+                entry["rules"], rule_class.transitions or {}
+            )
+        return entry["index"]
+
+    def invalidate(self, rule_class: Type["BaseModelRule"]) -> None:
+        with self._lock:
+            self._rules.pop(rule_class, None)
+        cache.set(self.get_version_key(rule_class), uuid.uuid4().hex, None)
+
+    def invalidate_on_commit(
+        self, sender: Type["BaseModelRule"], **kwargs: Any
+    ) -> None:
+        rule_class: Any = sender._meta.concrete_model
+        self.invalidate(rule_class)
+        # Other processes could reload the old rows before the transaction commits
+        transaction.on_commit(lambda: self.invalidate(rule_class))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rules.clear()
+
+
+rule_cache = RuleCache()
@@ -16,6 +16,28 @@ DEFAULTS = {
     ],
     "SAVE_HISTORY_CONTENT": True,
     "REMINDERS_CHECK_PERIOD": 60,
+    "REMINDERS_BATCH_SIZE": 1000,
+    "REMINDERS_LOCK_TIMEOUT": 600,
+    "TEMPLATE_CACHE": True,
+    "HISTORY_WRITE_BEHIND": False,
+    "HISTORY_FLUSH_SIZE": 500,
+    "HISTORY_FLUSH_INTERVAL_MS": 1000,
+    "ASYNC_NOTIFICATIONS_BATCH_SIZE": 500,
+    "FANOUT_CHUNK_SIZE": 1000,
+    "FANOUT_CONCURRENCY": 0,
+    "TIMINGS_SAMPLE_SIZE": 1000,
+    "TIMING_HOOKS": [],
+    "EMAIL_PER_RECIPIENT": False,
+    "EMAIL_CONNECTION_IDLE_TIMEOUT": 30,
+    "PUSH_CHUNK_SIZE": 500,
+    "PUSH_CONCURRENCY": 4,
+    "WEBHOOK_CONNECT_TIMEOUT": 5,
+    "WEBHOOK_READ_TIMEOUT": 30,
+    "WEBHOOK_CONCURRENCY": 8,
+    "WEBHOOK_POOL_SIZE": 10,
+    "WEBHOOK_BATCH_SIZE": 0,
+    "SINK_CHANNEL_LATENCY_MS": 0,
+    "SINK_CHANNEL_FAILURE_RATE": 0.0,
 }
 
 IMPORT_STRINGS: list = []
@@ -0,0 +1,65 @@
+import atexit
+import logging
+from typing import Any
+
+from celery.signals import worker_process_shutdown, worker_shutdown
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+from df_notifications.decorators import reminder_classes
+from df_notifications.history import history_writer
+from df_notifications.models import ReminderState
+from df_notifications.template_cache import template_cache
+
+logger = logging.getLogger(__name__)
+
+if apps.is_installed("dbtemplates"):
+    from dbtemplates.models import Template
+
+    post_save.connect(
+        template_cache.invalidate,
+        sender=Template,
+        weak=False,
+        dispatch_uid="df_notifications_template_cache_save",
+    )
+    post_delete.connect(
+        template_cache.invalidate,
+        sender=Template,
+        weak=False,
+        dispatch_uid="df_notifications_template_cache_delete",
+    )
+
+
+def flush_history(*args: Any, **kwargs: Any) -> None:
+    history_writer.try_flush()
+
+
+atexit.register(flush_history)
+worker_shutdown.connect(flush_history, weak=False)
+worker_process_shutdown.connect(flush_history, weak=False)
+
+
+def backfill_reminder_state(
+    sender: Any, using: str = DEFAULT_DB_ALIAS, **kwargs: Any
+) -> None:
+    # Reminders sent before ReminderState existed would be sent again
+    if using != DEFAULT_DB_ALIAS:
+        return
+    tables = set(connections[using].introspection.table_names())
+    if ReminderState._meta.db_table not in tables:
+        return
+    for label, model in reminder_classes.items():
+        backfill_state = getattr(model, "backfill_state", None)
+        if backfill_state is None or model._meta.db_table not in tables:
+            continue
+        if backfill_state():
+            logger.info("Rebuilt reminder state of %s from history", label)
+
+
+post_migrate.connect(
+    backfill_reminder_state,
+    sender=apps.get_app_config("df_notifications"),
+    weak=False,
+    dispatch_uid="df_notifications_backfill_reminder_state",
+)
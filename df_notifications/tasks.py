@@ -1,31 +1,154 @@
 # type: ignore
 
-from typing import Any, Dict, List, Type, Union
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, Union
 
+from celery import Signature, Task, chain, chord
 from celery import current_app as app
 from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import models
+from django.utils import timezone
 
+from df_notifications.decorators import reminder_classes
+from df_notifications.instrumentation import timings
 from df_notifications.models import (
     BaseModelReminder,
     NotificationModelMixin,
+    render_parts,
     send_notification,
 )
 from df_notifications.settings import api_settings
+from df_notifications.utils import iter_pk_buckets, iter_pk_ranges
+
+logger = logging.getLogger(__name__)
 
 
 @app.on_after_finalize.connect
 def setup_periodic_tasks(sender: Any, **kwargs: Any) -> None:
-    sender.add_periodic_task(
-        api_settings.REMINDERS_CHECK_PERIOD, register_reminders_task.s()
-    )
+    # Each reminder class runs on its own schedule so that slow reminders
+    # do not delay the others
+    for label, model in reminder_classes.items():
+        sender.add_periodic_task(
+            model.get_check_period(),
+            invoke_reminder_task.s(label),
+            name=f"df_notifications:reminders:{label}",
+        )
 
 
 @app.task()
 def register_reminders_task() -> None:
-    for model in apps.get_models():
-        if issubclass(model, BaseModelReminder):
-            model.invoke()
+    for model in reminder_classes.values():
+        run_reminder(model)
+
+
+def run_reminder(model: Type[BaseModelReminder]) -> None:
+    if (
+        model.chunk_size
+        and not getattr(model, "scheduled", False)
+        and not getattr(model, "incremental", False)
+    ):
+        dispatch_reminder_chunks(model)
+    else:
+        model.invoke()
+        schedule_reminder_wakeup(model)
+
+
+def dispatch_reminder_chunks(model: Type[BaseModelReminder]) -> int:
+    """
+    Splits the candidates of every reminder into primary key buckets of
+    `chunk_size` keys and processes each bucket in its own task.
+
+    Buckets are fixed, so a chunk still locked by a previous beat has the same
+    bounds and is skipped. Models without integer primary keys are split into
+    ranges of `chunk_size` rows instead, whose bounds may shift between beats.
+    """
+    label = model._meta.label_lower
+    if isinstance(model.model._meta.pk, models.IntegerField):
+        iter_chunks = iter_pk_buckets
+    else:
+        iter_chunks = iter_pk_ranges
+    chunks = 0
+    for reminder in model.get_queryset():
+        reminder_chunks = 0
+        for first_pk, last_pk in iter_chunks(
+            reminder.get_model_queryset(), model.chunk_size
+        ):
+            invoke_reminder_chunk_task.delay(label, reminder.pk, first_pk, last_pk)
+            reminder_chunks += 1
+        logger.info(
+            "Dispatched %s chunks for reminder %s %s",
+            reminder_chunks,
+            label,
+            reminder.pk,
+        )
+        chunks += reminder_chunks
+    return chunks
+
+
+@app.task
+def invoke_reminder_chunk_task(
+    reminder_class: str, reminder_pk: Any, first_pk: Any, last_pk: Any
+) -> Dict[str, Any]:
+    lock = f"df_notifications:reminders:lock:{reminder_class}:{reminder_pk}:{first_pk}:{last_pk}"
+    # A previous beat may still be processing the same chunk
+    if not cache.add(lock, 1, api_settings.REMINDERS_LOCK_TIMEOUT):
+        logger.info("Skipping locked chunk %s", lock)
+        return {"skipped": True}
+
+    try:
+        model = reminder_classes[reminder_class]
+        reminder = model.objects.filter(pk=reminder_pk).first()
+        if reminder is None:
+            return {"skipped": True}
+
+        started = time.perf_counter()
+        sent = reminder.process(
+            reminder.get_model_queryset().filter(pk__gte=first_pk, pk__lte=last_pk)
+        )
+        duration = time.perf_counter() - started
+        timings.record("reminders.chunk", duration, reminder=reminder_class)
+        logger.info(
+            "Processed chunk %s-%s of reminder %s %s: %s sent in %.3fs",
+            first_pk,
+            last_pk,
+            reminder_class,
+            reminder_pk,
+            sent,
+            duration,
+        )
+        return {"skipped": False, "sent": sent, "duration": duration}
+    finally:
+        cache.delete(lock)
+
+
+@app.task
+def invoke_reminder_task(reminder_class: str) -> None:
+    run_reminder(reminder_classes[reminder_class])
+
+
+def schedule_reminder_wakeup(model: Type[BaseModelReminder]) -> None:
+    """
+    Runs scheduled reminders again when the next one is due before the next
+    periodic check.
+    """
+    if not getattr(model, "scheduled", False):
+        return
+
+    next_due_at = model.get_next_due_at()
+    if next_due_at is None:
+        return
+    countdown = (next_due_at - timezone.now()).total_seconds()
+    if countdown >= model.get_check_period():
+        return
+
+    label = model._meta.label_lower
+    # Only one wakeup per reminder class is pending at any time
+    if cache.add(f"df_notifications:reminders:wakeup:{label}", 1, max(countdown, 1)):
+        invoke_reminder_task.apply_async(args=[label], countdown=max(countdown, 0))
 
 
 @app.task
@@ -40,6 +163,69 @@ def send_model_notification_task(
     NotificationModelMixin.send(notification, instance)
 
 
+@app.task(bind=True, max_retries=3, default_retry_delay=60)
+def send_model_notifications_batch_task(
+    self: Task, notifications: List[List[str]]
+) -> None:
+    """
+    Sends many (model notification class, notification pk, model pk) triples,
+    fetching notifications and instances in bulk per class.
+
+    A failing item does not stop the others, failed items are retried in a
+    new batch.
+    """
+    failed = []
+    grouped = defaultdict(list)
+    for model_notification_class, notification_pk, model_pk in notifications:
+        grouped[model_notification_class].append((notification_pk, model_pk))
+
+    for model_notification_class, items in grouped.items():
+        ModelNotification: Type[NotificationModelMixin] = apps.get_model(
+            model_notification_class
+        )
+        notification_pk_field = ModelNotification._meta.pk
+        model_pk_field = ModelNotification.model._meta.pk
+        items = [
+            (
+                notification_pk_field.to_python(notification_pk),
+                model_pk_field.to_python(model_pk),
+            )
+            for notification_pk, model_pk in items
+        ]
+        notifications_by_pk = ModelNotification.objects.in_bulk(
+            {notification_pk for notification_pk, _ in items}
+        )
+        instances = ModelNotification.model.objects.in_bulk(
+            {model_pk for _, model_pk in items}
+        )
+        for notification_pk, model_pk in items:
+            notification = notifications_by_pk.get(notification_pk)
+            instance = instances.get(model_pk)
+            if notification is None or instance is None:
+                logger.warning(
+                    "Skipping %s %s for %s: deleted before it was sent",
+                    model_notification_class,
+                    notification_pk,
+                    model_pk,
+                )
+                continue
+            try:
+                NotificationModelMixin.send(notification, instance)
+            except Exception:
+                logger.exception(
+                    "Failed to send %s %s for %s",
+                    model_notification_class,
+                    notification_pk,
+                    model_pk,
+                )
+                failed.append(
+                    [model_notification_class, str(notification_pk), str(model_pk)]
+                )
+
+    if failed:
+        raise self.retry(args=[failed])
+
+
 @app.task
 def send_notification_task(
     user_ids: list,
@@ -50,3 +236,120 @@ def send_notification_task(
     User = get_user_model()  # type: ignore
     users = User.objects.filter(id__in=user_ids)
     send_notification(users, channel_name, template_prefixes, context)
+
+
+def get_user_id_ranges(
+    user_filter: Dict[str, Any], chunk_size: int
+) -> Iterator[Tuple[Any, Any]]:
+    User = get_user_model()  # type: ignore
+    return iter_pk_ranges(User.objects.filter(**user_filter), chunk_size)
+
+
+def build_notification_fanout(
+    channel_name: str,
+    template_prefixes: Union[List[str], str],
+    context: Dict[str, Any],
+    user_ids: Optional[list] = None,
+    user_filter: Optional[Dict[str, Any]] = None,
+    chunk_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> Signature:
+    """
+    Builds a chord that sends a notification to `user_ids` or to the users
+    matching `user_filter`, split into chunks of `chunk_size` users.
+
+    Shared parts are rendered once here. With `concurrency` the chunks are
+    spread over that many chains, so no more chunks run at the same time. A
+    failing chunk is skipped after its retries, without stopping its chain.
+    """
+    if isinstance(template_prefixes, str):
+        template_prefixes = [template_prefixes]
+    chunk_size = chunk_size or api_settings.FANOUT_CHUNK_SIZE
+    concurrency = concurrency or api_settings.FANOUT_CONCURRENCY
+
+    if user_ids is not None:
+        chunk_filters = [
+            {"pk__in": user_ids[i : i + chunk_size]}
+            for i in range(0, len(user_ids), chunk_size)
+        ]
+    else:
+        chunk_filters = [
+            {**(user_filter or {}), "pk__gte": first_pk, "pk__lte": last_pk}
+            for first_pk, last_pk in get_user_id_ranges(user_filter or {}, chunk_size)
+        ]
+
+    parts = render_parts(channel_name, template_prefixes, context)
+    if concurrency:
+        lanes = [chunk_filters[i::concurrency] for i in range(concurrency)]
+    else:
+        lanes = [[chunk_filter] for chunk_filter in chunk_filters]
+
+    args = (channel_name, template_prefixes, context, parts)
+    return chord(
+        [
+            chain(
+                send_notification_chunk_task.s(0, lane[0], *args),
+                *[send_notification_chunk_task.s(f, *args) for f in lane[1:]],
+            )
+            for lane in lanes
+            if lane
+        ],
+        aggregate_notification_chunks_task.s(len(chunk_filters)),
+    )
+
+
+@app.task
+def send_notification_fanout_task(
+    channel_name: str,
+    template_prefixes: Union[List[str], str],
+    context: Dict[str, Any],
+    user_ids: Optional[list] = None,
+    user_filter: Optional[Dict[str, Any]] = None,
+    chunk_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> None:
+    build_notification_fanout(
+        channel_name,
+        template_prefixes,
+        context,
+        user_ids=user_ids,
+        user_filter=user_filter,
+        chunk_size=chunk_size,
+        concurrency=concurrency,
+    ).apply_async()
+
+
+@app.task(bind=True, max_retries=3, default_retry_delay=30)
+def send_notification_chunk_task(
+    self: Task,
+    sent: int,
+    user_filter: Dict[str, Any],
+    channel_name: str,
+    template_prefixes: List[str],
+    context: Dict[str, Any],
+    parts: Dict[str, str],
+) -> int:
+    """
+    Sends to one chunk of users and adds them to `sent`. A chunk that still
+    fails after its retries is logged and skipped, so that the next chunks of
+    its chain and the chord body still run.
+    """
+    User = get_user_model()  # type: ignore
+    users = list(User.objects.filter(**user_filter))
+    if not users:
+        return sent
+    try:
+        send_notification(users, channel_name, template_prefixes, context, parts)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e) from e
+        logger.exception("Failed to send notification to chunk %s", user_filter)
+        return sent
+    return sent + len(users)
+
+
+@app.task
+def aggregate_notification_chunks_task(results: List[int], chunks: int) -> int:
+    sent = sum(results)
+    logger.info("Sent notification to %s users in %s chunks", sent, chunks)
+    return sent
@@ -0,0 +1,95 @@
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from django.core.cache import cache
+from django.db import transaction
+from django.template import TemplateDoesNotExist
+from django.template.loader import select_template
+
+CacheKey = Tuple[str, Tuple[str, ...], str]
+
+
+def get_template_names(
+    channel: str, template_prefixes: Sequence[str], part: str
+) -> List[str]:
+    templates = []
+    for prefix in template_prefixes:
+        templates.append(f"{prefix}{channel}__{part}")
+        templates.append(f"{prefix}{part}")
+    return templates
+
+
+class TemplateCache:
+    """
+    Process-local cache of resolved notification templates.
+
+    Maps (channel, template prefixes, part) to the compiled template the loaders
+    resolved it to. Misses are remembered too, so a part that does not exist
+    is not probed again on every notification.
+
+    A version token in Django's cache framework is replaced whenever a
+    database template changes, which makes every process drop its templates
+    on the next lookup.
+    """
+
+    version_key = "df_notifications:templates"
+
+    def __init__(self) -> None:
+        self._templates: Dict[CacheKey, Union[Any, TemplateDoesNotExist]] = {}
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_version(self) -> Optional[str]:
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get(self, channel: str, template_prefixes: Sequence[str], part: str) -> Any:
+        version = self.get_version()
+        if version != self._version:
+            with self._lock:
+                self._templates.clear()
+                self._version = version
+
+        key = (channel, tuple(template_prefixes), part)
+        try:
+            template = self._templates[key]
+        except KeyError:
+            self.misses += 1
+            try:
+                template = select_template(
+                    get_template_names(channel, template_prefixes, part)
+                )
+            except TemplateDoesNotExist as e:
+                template = e
+            with self._lock:
+                self._templates[key] = template
+        else:
+            self.hits += 1
+
+        if isinstance(template, TemplateDoesNotExist):
+            raise template
+        return template
+
+    def clear(self, *args: Any, **kwargs: Any) -> None:
+        with self._lock:
+            self._templates.clear()
+
+    def invalidate(self, *args: Any, **kwargs: Any) -> None:
+        self.clear()
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        # Other processes could reload the old template before the commit
+        transaction.on_commit(
+            lambda: cache.set(self.version_key, uuid.uuid4().hex, None)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._templates)}
+
+
+template_cache = TemplateCache()
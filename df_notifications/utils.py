@@ -0,0 +1,89 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+
+def get_commit_buffers(
+    name: str,
+    flush: Callable[[Any], None],
+    factory: Callable[[], Any] = dict,
+    using: Optional[str] = None,
+) -> Optional[List[Any]]:
+    """
+    Returns the buffers collected until the current transaction commits.
+
+    There is one buffer per savepoint, listed from the outermost to the one of
+    the current savepoint, which is created if needed. On commit every buffer
+    is passed to `flush`. A buffer is dropped when its savepoint or the
+    transaction is rolled back. Returns None outside of a transaction.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+
+    buffers = connection.__dict__.setdefault("df_notifications_commit_buffers", {})
+    entries = [
+        entry for entry in buffers.get(name, []) if is_registered(connection, entry)
+    ]
+    sids = tuple(connection.savepoint_ids)
+    if not entries or entries[-1]["sids"] != sids:
+        buffer = factory()
+        entry: Dict[str, Any] = {"sids": sids, "buffer": buffer}
+
+        def callback() -> None:
+            pending = buffers.get(name, [])
+            buffers[name] = [other for other in pending if other is not entry]
+            flush(buffer)
+
+        transaction.on_commit(callback, using)
+        entry["callback"] = callback
+        entry["position"] = len(connection.run_on_commit) - 1
+        entries.append(entry)
+
+    buffers[name] = entries
+    return [entry["buffer"] for entry in entries]
+
+
+def is_registered(connection: Any, entry: Dict[str, Any]) -> bool:
+    # Rolling back a savepoint removes its callbacks, so the callback can
+    # only have moved towards the start of the list
+    run_on_commit = connection.run_on_commit
+    for position in range(min(entry["position"], len(run_on_commit) - 1), -1, -1):
+        if run_on_commit[position][1] is entry["callback"]:
+            entry["position"] = position
+            return True
+    return False
+
+
+def iter_pk_ranges(qs: QuerySet, chunk_size: int) -> Iterator[Tuple[Any, Any]]:
+    """
+    Yields (first pk, last pk) ranges of at most `chunk_size` rows of `qs`,
+    paginating by primary key instead of OFFSET.
+    """
+    qs = qs.order_by("pk").values_list("pk", flat=True)
+    last_pk = None
+    while True:
+        page = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+        pks = list(page[:chunk_size])
+        if not pks:
+            return
+        yield pks[0], pks[-1]
+        last_pk = pks[-1]
+
+
+def iter_pk_buckets(qs: QuerySet, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Yields (first pk, last pk) bounds of the fixed buckets of `chunk_size`
+    integer primary keys that contain rows of `qs`.
+
+    Unlike `iter_pk_ranges` the bounds do not depend on which rows currently
+    match, so the same bucket has the same bounds on every run.
+    """
+    qs = qs.order_by("pk").values_list("pk", flat=True)
+    pk = qs.first()
+    while pk is not None:
+        first_pk = pk // chunk_size * chunk_size
+        last_pk = first_pk + chunk_size - 1
+        yield first_pk, last_pk
+        pk = qs.filter(pk__gt=last_pk).first()
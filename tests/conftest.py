@@ -0,0 +1,14 @@
+from typing import Generator
+
+import pytest
+
+from df_notifications.rule_cache import rule_cache
+from df_notifications.template_cache import template_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_caches() -> Generator[None, None, None]:
+    # Rolled back test transactions do not send post_delete signals
+    yield
+    rule_cache.clear()
+    template_cache.clear()
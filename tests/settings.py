@@ -102,6 +102,7 @@ DF_NOTIFICATIONS = {
         "webhook": "df_notifications.channels.JSONPostWebhookChannel",
         "slack": "df_notifications.channels.SlackChannel",
         "test": "tests.channels.TestChannel",
+        "sink": "df_notifications.channels.SinkChannel",
     },
     "SAVE_HISTORY_CONTENT": True,
     "REMINDERS_CHECK_PERIOD": 5,
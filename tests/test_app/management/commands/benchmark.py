@@ -0,0 +1,207 @@
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+from dbtemplates.models import Template
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from kombu import Queue
+from kombu.serialization import dumps
+
+from df_notifications.models import ReminderState, send_notification
+from df_notifications.rule_cache import rule_cache
+from df_notifications.tasks import send_notification_task
+from tests.test_app.models import Post, PostNotificationReminder, PostNotificationRule
+
+TEMPLATE_PREFIX = "df_notifications/posts/published/"
+# Published tasks go to a queue no worker consumes, deleted afterwards
+BENCHMARK_QUEUE = "df_notifications.benchmark"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure notification hot paths on the test app and print the results "
+        "as JSON. Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--rules", type=int, nargs="+", default=[1, 10, 100])
+        parser.add_argument(
+            "--state-rows",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 1_000_000],
+            help="ReminderState rows to create for the reminder scan, one run each",
+        )
+        parser.add_argument("--output", help="Write the results to this file")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        results: List[Dict[str, Any]] = []
+        with transaction.atomic():
+            self.setup()
+            results.append(self.bench_send(options["iterations"]))
+            results.append(self.bench_task_dispatch(options["iterations"]))
+            for count in options["rules"]:
+                results.append(self.bench_rules(count, options["iterations"]))
+            for count in options["state_rows"]:
+                results.append(self.bench_reminder_scan(count))
+            transaction.set_rollback(True)
+        rule_cache.clear()
+
+        output = json.dumps({"results": results}, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def setup(self) -> None:
+        Template.objects.create(
+            name=f"{TEMPLATE_PREFIX}subject.txt", content="New post: {{ title }}"
+        )
+        Template.objects.create(
+            name=f"{TEMPLATE_PREFIX}body.txt", content="{{ description }}"
+        )
+        self.user = User.objects.create(username="benchmark")
+
+    def measure(
+        self, name: str, iterations: int, fn: Callable[[], Any], **params: Any
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        total = time.perf_counter() - started
+        return {
+            "name": name,
+            "params": params,
+            "iterations": iterations,
+            "total": total,
+            "per_op": total / iterations if iterations else 0.0,
+            "ops_per_sec": iterations / total if total else 0.0,
+        }
+
+    def send(self) -> None:
+        send_notification(
+            [self.user],  # type: ignore
+            "console",
+            TEMPLATE_PREFIX,
+            {"title": "title", "description": "description"},
+        )
+
+    def bench_send(self, iterations: int) -> Dict[str, Any]:
+        return self.measure("send_notification", iterations, self.send)
+
+    def bench_task_dispatch(self, iterations: int) -> Dict[str, Any]:
+        """
+        Measures publishing the task to the configured broker, or only building
+        and serializing its message when the broker is not reachable.
+        """
+        args = [
+            [self.user.pk],
+            "console",
+            TEMPLATE_PREFIX,
+            {"title": "title", "description": "description"},
+        ]
+        app = send_notification_task.app
+        with app.connection_for_write() as connection:
+            try:
+                connection.ensure_connection(max_retries=1)
+            except Exception:
+                broker = False
+            else:
+                broker = True
+
+            if broker:
+
+                def dispatch() -> None:
+                    send_notification_task.apply_async(
+                        args=args, queue=BENCHMARK_QUEUE, connection=connection
+                    )
+
+            else:
+
+                def dispatch() -> None:
+                    message = app.amqp.as_task_v2(
+                        "benchmark", send_notification_task.name, args=args
+                    )
+                    dumps(message.body, serializer=app.conf.task_serializer)
+
+            try:
+                result = self.measure(
+                    "send_notification_task",
+                    iterations,
+                    dispatch,
+                    dispatch="broker" if broker else "serialize",
+                )
+            finally:
+                if broker:
+                    Queue(BENCHMARK_QUEUE).bind(connection.default_channel).delete()
+
+        baseline = self.measure("send_notification", iterations, self.send)
+        result["inline_per_op"] = baseline["per_op"]
+        return result
+
+    def bench_rules(self, count: int, iterations: int) -> Dict[str, Any]:
+        PostNotificationRule.objects.all().delete()
+        PostNotificationRule.objects.bulk_create(
+            [
+                PostNotificationRule(
+                    channel="console",
+                    template_prefix=TEMPLATE_PREFIX,
+                    is_published_prev=False,
+                    is_published_next=True,
+                )
+                for _ in range(count)
+            ]
+        )
+        rule_cache.invalidate(PostNotificationRule)
+        post = Post.objects.create(
+            title="title", description="description", author=self.user
+        )
+
+        def save() -> None:
+            post.is_published = not post.is_published
+            post.save()
+
+        return self.measure("rule_invoke", iterations, save, rules=count)
+
+    def bench_reminder_scan(self, count: int) -> Dict[str, Any]:
+        Post.objects.all().delete()
+        PostNotificationReminder.objects.all().delete()
+        reminder = PostNotificationReminder.objects.create(
+            channel="console", template_prefix=TEMPLATE_PREFIX
+        )
+        posts = Post.objects.bulk_create(
+            [
+                Post(
+                    title="title",
+                    description="description",
+                    author=self.user,
+                    is_published=True,
+                )
+                for _ in range(count)
+            ],
+            batch_size=10_000,
+        )
+        content_type = ContentType.objects.get_for_model(PostNotificationReminder)
+        # Every other instance was already reminded and is skipped by the scan
+        ReminderState.objects.bulk_create(
+            [
+                ReminderState(
+                    content_type=content_type,
+                    reminder_id=str(reminder.pk),
+                    instance_id=str(post.pk),
+                    sent_count=reminder.repeat,
+                )
+                for post in posts[::2]
+            ],
+            batch_size=10_000,
+        )
+
+        def scan() -> None:
+            list(reminder.get_model_queryset().values_list("pk", flat=True))
+
+        return self.measure("reminder_scan", 1, scan, state_rows=count)
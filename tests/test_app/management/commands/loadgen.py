@@ -0,0 +1,159 @@
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Type
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection
+
+from df_notifications.history import history_writer
+from df_notifications.instrumentation import get_percentile
+from df_notifications.models import NotificationHistory, get_channel_instance
+from df_notifications.settings import api_settings
+from tests.test_app.models import (
+    AsyncPostNotificationRule,
+    BasePostNotificationRule,
+    Post,
+    PostNotificationReminder,
+    PostNotificationRule,
+)
+
+TEMPLATE_PREFIX = "post/"
+RULE_CLASSES: Dict[str, Type[BasePostNotificationRule]] = {
+    "rule": PostNotificationRule,
+    "async-rule": AsyncPostNotificationRule,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive synthetic saves of Post instances through rules or reminders and "
+        "report throughput, queue lag and queries per notification as JSON."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--instances", type=int, default=100)
+        parser.add_argument(
+            "--mode", choices=["rule", "async-rule", "reminder"], default="rule"
+        )
+        parser.add_argument(
+            "--rate", type=float, default=0, help="Saves per second, 0 is unlimited"
+        )
+        parser.add_argument("--channel", default="sink")
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30,
+            help="Seconds to wait for asynchronous notifications",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the generated rows"
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options["channel"] not in api_settings.CHANNELS:
+            raise CommandError(f"Channel {options['channel']} is not configured")
+
+        run = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create(
+            [User(username=f"loadgen-{run}-{i}") for i in range(options["users"])]
+        )
+        posts = Post.objects.bulk_create(
+            [
+                Post(
+                    title=f"Load {i}",
+                    description="Generated",
+                    author=users[i % len(users)],
+                )
+                for i in range(options["instances"])
+            ]
+        )
+        if options["mode"] == "reminder":
+            action: Any = PostNotificationReminder.objects.create(
+                channel=options["channel"], template_prefix=TEMPLATE_PREFIX
+            )
+        else:
+            action = RULE_CLASSES[options["mode"]].objects.create(
+                channel=options["channel"],
+                template_prefix=TEMPLATE_PREFIX,
+                is_published_prev=False,
+                is_published_next=True,
+            )
+
+        try:
+            report = self.drive(posts, options)
+        finally:
+            if not options["keep"]:
+                action.delete()
+                Post.objects.filter(pk__in=[post.pk for post in posts]).delete()
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def drive(self, posts: List[Post], options: Dict[str, Any]) -> Dict[str, Any]:
+        queries = 0
+
+        def count_queries(execute: Any, *args: Any) -> Any:
+            nonlocal queries
+            queries += 1
+            return execute(*args)
+
+        errors = 0
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            for i, post in enumerate(posts):
+                if options["rate"]:
+                    delay = started + i / options["rate"] - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                post.is_published = True
+                try:
+                    post.save()
+                except Exception:
+                    errors += 1
+            if options["mode"] == "reminder":
+                try:
+                    PostNotificationReminder.invoke()
+                except Exception:
+                    errors += 1
+            history_writer.flush()
+        saved = time.perf_counter() - started
+
+        history = NotificationHistory.objects.filter(
+            instance_id__in=[str(post.pk) for post in posts]
+        )
+        deadline = time.perf_counter() + options["timeout"]
+        while (
+            options["mode"] == "async-rule"
+            and history.count() < len(posts)
+            and time.perf_counter() < deadline
+        ):
+            time.sleep(0.1)
+        elapsed = time.perf_counter() - started
+
+        updated = {str(post.pk): post.updated for post in posts}
+        lags = sorted(
+            (created - updated[instance_id]).total_seconds()
+            for instance_id, created in history.values_list("instance_id", "created")
+        )
+        notifications = len(lags)
+        channel = get_channel_instance(options["channel"])
+        return {
+            "mode": options["mode"],
+            "instances": len(posts),
+            "saves_per_sec": len(posts) / saved if saved else 0.0,
+            "notifications": notifications,
+            "notifications_per_sec": notifications / elapsed if elapsed else 0.0,
+            "errors": errors,
+            "channel_failures": getattr(channel, "failures", None),
+            "lag": {
+                "max": lags[-1] if lags else 0.0,
+                **{f"p{p}": get_percentile(lags, p) for p in (50, 95, 99)},
+            },
+            "queries": queries,
+            "queries_per_notification": queries / notifications
+            if notifications
+            else 0.0,
+        }
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:30
+
+import datetime
+import df_notifications.fields
+import df_notifications.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("df_notifications", "0012_reminderwatermark"),
+        ("test_app", "0007_asyncpostnotificationrule"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AsyncPostNotificationReminder",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "channel",
+                    df_notifications.fields.NoMigrationsChoicesField(max_length=255),
+                ),
+                ("template_prefix", models.CharField(max_length=255)),
+                ("context", models.JSONField(blank=True, default=dict)),
+                (
+                    "delay",
+                    models.DurationField(
+                        default=datetime.timedelta(0),
+                        help_text="Send the reminder after this period of time",
+                    ),
+                ),
+                (
+                    "cooldown",
+                    models.DurationField(
+                        default=datetime.timedelta(seconds=3600),
+                        help_text="Wait so much time before reminding again",
+                    ),
+                ),
+                (
+                    "repeat",
+                    models.SmallIntegerField(
+                        default=1, help_text="Repeat the reminder this many times"
+                    ),
+                ),
+                (
+                    "action",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        help_text="Python code to execute. You can use `instance` variable to access current model",
+                    ),
+                ),
+                ("is_published", models.BooleanField(default=True)),
+                (
+                    "history",
+                    models.ManyToManyField(
+                        blank=True,
+                        editable=False,
+                        to="df_notifications.notificationhistory",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+            bases=(
+                df_notifications.models.AsyncNotificationMixin,
+                df_notifications.models.GenericBase,
+                models.Model,
+            ),
+        ),
+    ]
@@ -1,9 +1,8 @@
 import json
-from typing import List, Optional, TypeVar
+from typing import List, TypeVar
 
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models import Q, QuerySet
 
 from df_notifications.decorators import (
     register_reminder_model,
@@ -46,6 +45,9 @@ class BasePostNotificationRule(NotificationModelRule):
         "is_published_next",
     ]
     tracking_fields = ["is_published"]
+    snapshot_on_load = True
+    transitions = {"is_published": ("is_published_prev", "is_published_next")}
+    cache_rules = True
 
     is_published_prev = models.BooleanField(default=False, null=True)
     is_published_next = models.BooleanField(default=True)
@@ -53,22 +55,6 @@ class BasePostNotificationRule(NotificationModelRule):
     def get_users(self, instance: M) -> list:
         return [instance.author]
 
-    @classmethod
-    def get_queryset(
-        cls, instance: Post, prev: Optional[Post]
-    ) -> QuerySet["BasePostNotificationRule"]:
-        qs = cls.objects.filter(
-            is_published_next=instance.is_published,
-        )
-
-        if prev:
-            qs = qs.filter(
-                Q(is_published_prev__isnull=True)
-                | Q(is_published_prev=prev.is_published),
-            )
-
-        return qs
-
     class Meta:
         abstract = True
 
@@ -83,10 +69,10 @@ class AsyncPostNotificationRule(AsyncNotificationMixin, BasePostNotificationRule
     pass
 
 
-@register_reminder_model
-class PostNotificationReminder(NotificationModelReminder):
+class BasePostNotificationReminder(NotificationModelReminder):
     MODIFIED_MODEL_FIELD = "updated"
     model = Post
+    condition_fields = {"is_published": "is_published"}
     admin_list_display = [
         "template_prefix",
         "channel",
@@ -101,3 +87,18 @@ class PostNotificationReminder(NotificationModelReminder):
 
     def get_users(self, instance: M) -> List[User]:
         return [instance.author]
+
+    class Meta:
+        abstract = True
+
+
+@register_reminder_model
+class PostNotificationReminder(BasePostNotificationReminder):
+    pass
+
+
+@register_reminder_model
+class AsyncPostNotificationReminder(
+    AsyncNotificationMixin, BasePostNotificationReminder
+):
+    pass
@@ -1,5 +1,11 @@
 # type: ignore
+import io
 import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from smtplib import SMTPServerDisconnected
 from typing import Any
 from unittest.mock import patch
 
@@ -7,18 +13,62 @@ import pytest
 from celery import Celery
 from dbtemplates.models import Template
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
+from firebase_admin.messaging import (
+    BatchResponse,
+    Message,
+    SendResponse,
+    UnregisteredError,
+)
+from kombu import Connection
 from pytest_mock import MockerFixture
 
-from df_notifications.channels import FirebasePushChannel, JSONPostWebhookChannel
-from df_notifications.decorators import disable_notification_signal
+from df_notifications import channels, models, tasks
+from df_notifications.channels import (
+    EmailChannel,
+    FirebasePushChannel,
+    JSONPostWebhookChannel,
+    PushEngine,
+)
+from df_notifications.decorators import (
+    check_rule_class,
+    disable_notification_signal,
+    get_snapshot_fields,
+)
+from df_notifications.history import history_writer
+from df_notifications.instrumentation import timings
 from df_notifications.models import (
     CustomPushMessage,
+    ModelSnapshot,
     NotificationHistory,
+    ReminderState,
+    ReminderWatermark,
     send_notification,
+    send_notifications_bulk,
+)
+from df_notifications.rule_cache import TransitionIndex
+from df_notifications.settings import api_settings
+from df_notifications.signals import backfill_reminder_state
+from df_notifications.tasks import (
+    build_notification_fanout,
+    dispatch_reminder_chunks,
+    get_user_id_ranges,
+    invoke_reminder_chunk_task,
+    invoke_reminder_task,
+    schedule_reminder_wakeup,
+    send_model_notifications_batch_task,
+    send_notification_task,
+    setup_periodic_tasks,
 )
-from df_notifications.tasks import send_notification_task
+from df_notifications.template_cache import template_cache
 from tests.test_app.models import (
+    AsyncPostNotificationReminder,
     AsyncPostNotificationRule,
     Post,
     PostNotificationReminder,
@@ -41,6 +91,17 @@ def setup_templates():
     )
 
 
+def setup_plain_templates():
+    Template.objects.create(
+        name="df_notifications/posts/published/subject.txt",
+        content="New post: {{ title }}",
+    )
+    Template.objects.create(
+        name="df_notifications/posts/published/body.txt",
+        content="{{ description }}",
+    )
+
+
 def setup_published_notification():
     action = PostNotificationRule(
         is_published_next=True,
@@ -82,7 +143,7 @@ def test_post_published_notification_created():
 
 
 @pytest.mark.django_db(transaction=True)
-@patch("df_notifications.models.transaction.on_commit", new=lambda fn: fn())
+@patch("df_notifications.utils.transaction.on_commit", new=lambda fn, using: fn())
 def test_post_published_notification_created_async(
     mocker: MockerFixture, celery_app: Celery, celery_worker: Any
 ) -> None:
@@ -371,7 +432,7 @@ def test_default_templates_rendered_if_no_template_exists():
     assert notification.content["body.txt"] == post.description
 
 
-@patch("df_notifications.channels.requests.post")
+@patch("df_notifications.channels.requests.Session.post")
 def test_json_post_webhook_channel(mock_requests_post):
     channel = JSONPostWebhookChannel()
     users = []
@@ -388,10 +449,14 @@ def test_json_post_webhook_channel(mock_requests_post):
         "https://hooks.example.com/hook_endpoint",
         data="Web hook Test",
         json={"notification": "Testing webhook"},
+        timeout=(
+            api_settings.WEBHOOK_CONNECT_TIMEOUT,
+            api_settings.WEBHOOK_READ_TIMEOUT,
+        ),
     )
 
 
-@patch("df_notifications.channels.requests.post")
+@patch("df_notifications.channels.requests.Session.post")
 def test_json_post_webhook_channel_with_invalid_context(mock_requests_post):
     """
     Test that an exception is raised,
@@ -470,3 +535,1429 @@ def test_firebase_push_channel() -> None:
             ),
         },
     )
+
+
+def test_template_cache_reuses_resolved_templates() -> None:
+    setup_plain_templates()
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    template_cache.clear()
+    hits, misses = template_cache.hits, template_cache.misses
+
+    for title in ["title 1", "title 2"]:
+        send_notification(
+            users=[user],
+            channel="console",
+            template_prefixes="df_notifications/posts/published/",
+            context={"title": title, "description": "description"},
+        )
+
+    assert template_cache.misses - misses == 2
+    assert template_cache.hits - hits == 2
+
+
+def test_template_cache_invalidated_on_db_template_change() -> None:
+    setup_plain_templates()
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    context = {"title": "title", "description": "description"}
+    send_notification([user], "console", "df_notifications/posts/published/", context)
+
+    Template.objects.filter(
+        name="df_notifications/posts/published/subject.txt"
+    ).get().delete()
+    Template.objects.create(
+        name="df_notifications/posts/published/subject.txt",
+        content="Updated: {{ title }}",
+    )
+
+    notification = send_notification(
+        [user], "console", "df_notifications/posts/published/", context
+    )
+    assert notification.content["subject.txt"] == "Updated: title"
+
+
+def test_template_cache_dropped_when_version_changes() -> None:
+    setup_plain_templates()
+    prefixes = ["df_notifications/posts/published/"]
+    template_cache.get("console", prefixes, "subject.txt")
+    misses = template_cache.misses
+
+    template_cache.get("console", prefixes, "subject.txt")
+    assert template_cache.misses == misses
+
+    # Another process changed a database template
+    cache.set(template_cache.version_key, "other")
+    template_cache.get("console", prefixes, "subject.txt")
+    assert template_cache.misses == misses + 1
+
+
+def test_send_notifications_bulk(mocker: MockerFixture) -> None:
+    setup_plain_templates()
+    user1 = User.objects.create(username="user1", email="user1@test.com")
+    user2 = User.objects.create(username="user2", email="user2@test.com")
+    render_parts = mocker.spy(models, "render_parts")
+
+    notifications = send_notifications_bulk(
+        [
+            ([user1], {"title": "title 1", "description": "description"}),
+            ([user2], {"title": "title 1", "description": "description"}),
+            ([user1, user2], {"title": "title 2", "description": "description"}),
+        ],
+        channel="console",
+        template_prefixes="df_notifications/posts/published/",
+    )
+
+    assert render_parts.call_count == 2
+    assert NotificationHistory.objects.count() == 3
+    assert [n.content["subject.txt"] for n in notifications] == [
+        "New post: title 1",
+        "New post: title 1",
+        "New post: title 2",
+    ]
+    assert list(notifications[0].users.all()) == [user1]
+    assert set(notifications[2].users.all()) == {user1, user2}
+
+
+def test_history_write_behind(mocker: MockerFixture) -> None:
+    mocker.patch.object(api_settings, "HISTORY_WRITE_BEHIND", True)
+    mocker.patch.object(api_settings, "HISTORY_FLUSH_INTERVAL_MS", 0)
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    post = Post.objects.create(
+        title="Title 1",
+        description="Content 1",
+        is_published=True,
+        author=user,
+    )
+
+    PostNotificationReminder.invoke()
+    assert not NotificationHistory.objects.exists()
+
+    add_users_bulk = mocker.patch.object(
+        NotificationHistory, "add_users_bulk", side_effect=RuntimeError
+    )
+    with pytest.raises(RuntimeError):
+        history_writer.flush()
+    assert not NotificationHistory.objects.exists()
+
+    # The failed rows are kept for the next flush
+    mocker.stop(add_users_bulk)
+    history_writer.flush()
+    notification = NotificationHistory.objects.get()
+    assert notification.instance == post
+    assert list(notification.users.all()) == [user]
+    assert list(reminder.history.all()) == [notification]
+
+
+def test_history_flush_outside_of_caller_transaction(mocker: MockerFixture) -> None:
+    mocker.patch.object(api_settings, "HISTORY_WRITE_BEHIND", True)
+    mocker.patch.object(api_settings, "HISTORY_FLUSH_INTERVAL_MS", 0)
+    mocker.patch.object(api_settings, "HISTORY_FLUSH_SIZE", 2)
+    flush_in_thread = mocker.patch.object(history_writer, "_flush_in_thread")
+    user = User.objects.create(
+        email="test@test.com",
+    )
+
+    history_writer.write(NotificationHistory(channel="console"), [user])
+    assert history_writer._timer is None
+    with pytest.raises(RuntimeError), transaction.atomic():
+        history_writer.write(NotificationHistory(channel="console"), [user])
+        raise RuntimeError
+
+    # The full buffer is flushed by the background thread, not in the
+    # transaction that was rolled back
+    history_writer._timer.join()
+    flush_in_thread.assert_called_once()
+    assert not NotificationHistory.objects.exists()
+    history_writer.flush()
+    assert NotificationHistory.objects.count() == 2
+
+
+def test_rule_uses_snapshot_instead_of_fetching_previous_instance(
+    django_assert_num_queries: Any,
+) -> None:
+    setup_published_notification()
+    setup_templates()
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    Post.objects.create(
+        title="Title 1",
+        description="Content 1",
+        is_published=False,
+        author=user,
+    )
+    post = Post.objects.get()
+
+    with django_assert_num_queries(1):
+        post.title = "Title 2"
+        post.save()
+
+    assert isinstance(post._pre_save_instance, ModelSnapshot)
+    assert post._pre_save_instance.is_published is False
+
+
+def test_snapshot_requires_opt_in(mocker: MockerFixture) -> None:
+    assert get_snapshot_fields(Post) == ["is_published"]
+    mocker.patch.object(AsyncPostNotificationRule, "snapshot_on_load", False)
+    assert get_snapshot_fields(Post) is None
+
+
+def test_snapshot_refreshed_with_refresh_from_db() -> None:
+    setup_published_notification()
+    setup_templates()
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    Post.objects.create(
+        title="Title 1",
+        description="Content 1",
+        is_published=False,
+        author=user,
+    )
+    post = Post.objects.get()
+    published = Post.objects.get()
+    published.is_published = True
+    published.save()
+    assert NotificationHistory.objects.count() == 1
+
+    post.refresh_from_db()
+    post.title = "Title 2"
+    post.save()
+    assert NotificationHistory.objects.count() == 1
+
+    Post.objects.update(is_published=False)
+    post.refresh_from_db(fields=["is_published"])
+    post.is_published = True
+    post.save()
+    assert NotificationHistory.objects.count() == 2
+
+
+def test_all_rule_classes_dispatched_once_per_save(
+    mocker: MockerFixture, django_capture_on_commit_callbacks: Any
+) -> None:
+    setup_published_notification()
+    setup_async_published_notification()
+    setup_templates()
+    send_task = mocker.patch("df_notifications.models.app.send_task")
+    timings.reset()
+    user = User.objects.create(
+        email="test@test.com",
+    )
+
+    with disable_notification_signal(Post):
+        pass
+    with django_capture_on_commit_callbacks(execute=True):
+        post = Post.objects.create(
+            title="Title 1",
+            description="Content 1",
+            is_published=True,
+            author=user,
+        )
+    assert NotificationHistory.objects.count() == 1
+    assert send_task.call_count == 1
+    assert timings.get("rules.dispatch", model="test_app.post")["count"] == 1
+
+    post.title = "Title 2"
+    post.save()
+    assert timings.get("rules.dispatch", model="test_app.post")["count"] == 1
+
+
+def test_cached_rules_skip_rule_queries(django_assert_num_queries: Any) -> None:
+    setup_published_notification()
+    setup_templates()
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    post = Post.objects.create(
+        title="Title 1",
+        description="Content 1",
+        is_published=True,
+        author=user,
+    )
+    assert NotificationHistory.objects.count() == 1
+
+    with django_assert_num_queries(1):
+        post.is_published = False
+        post.save()
+
+    PostNotificationRule.objects.update(is_published_prev=True, is_published_next=False)
+    PostNotificationRule.objects.get().save()
+    post.is_published = True
+    post.save()
+    post.is_published = False
+    post.save()
+    assert NotificationHistory.objects.count() == 2
+
+
+def test_cached_rules_require_filter_rules_with_get_condition(
+    mocker: MockerFixture,
+) -> None:
+    check_rule_class(PostNotificationRule)
+
+    def get_condition(cls: Any, instance: Any, prev: Any) -> Q:
+        return Q(channel=instance.description)
+
+    mocker.patch.object(
+        PostNotificationRule, "get_condition", classmethod(get_condition)
+    )
+    with pytest.raises(ImproperlyConfigured):
+        check_rule_class(PostNotificationRule)
+
+    def filter_rules(cls: Any, rules: Any, instance: Any, prev: Any) -> list:
+        return [rule for rule in rules if rule.channel == instance.description]
+
+    patched = mocker.patch.object(
+        PostNotificationRule, "filter_rules", classmethod(filter_rules)
+    )
+    check_rule_class(PostNotificationRule)
+
+    mocker.stop(patched)
+    mocker.patch.object(PostNotificationRule, "cache_rules", False)
+    check_rule_class(PostNotificationRule)
+
+
+def test_transition_index_matches_queryset() -> None:
+    for prev_value, next_value in [
+        (False, True),
+        (None, True),
+        (True, False),
+        (None, False),
+    ]:
+        PostNotificationRule.objects.create(
+            is_published_prev=prev_value,
+            is_published_next=next_value,
+            channel="console",
+            template_prefix="df_notifications/posts/published/",
+        )
+    index = TransitionIndex(
+        list(PostNotificationRule.objects.order_by("pk")),
+        PostNotificationRule.transitions,
+    )
+
+    for old, new in [(None, True), (None, False), (False, True), (True, False)]:
+        instance = Post(is_published=new)
+        prev = None if old is None else ModelSnapshot(1, {"is_published": old})
+        assert index.match(instance, prev) == list(
+            PostNotificationRule.get_queryset(instance, prev).order_by("pk")
+        )
+    assert len(index.match(Post(is_published=True), None)) == 2
+    assert index.match(
+        Post(is_published=True), ModelSnapshot(1, {"is_published": True})
+    ) == [
+        PostNotificationRule.objects.get(is_published_prev=None, is_published_next=True)
+    ]
+
+
+def test_rules_coalesced_per_instance_on_commit(
+    mocker: MockerFixture, django_capture_on_commit_callbacks: Any
+) -> None:
+    setup_published_notification()
+    setup_templates()
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    Post.objects.create(
+        title="Title 1",
+        description="Content 1",
+        is_published=False,
+        author=user,
+    )
+    post = Post.objects.get()
+    mocker.patch.object(PostNotificationRule, "coalesce_on_commit", True)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            post.is_published = True
+            post.save()
+            post.is_published = False
+            post.save()
+    assert not NotificationHistory.objects.exists()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            post.is_published = True
+            post.save()
+            post.title = "Title 2"
+            post.save()
+            assert not NotificationHistory.objects.exists()
+    assert NotificationHistory.objects.count() == 1
+
+
+def test_coalesced_rules_send_in_one_batch(
+    mocker: MockerFixture, django_capture_on_commit_callbacks: Any
+) -> None:
+    setup_published_notification()
+    setup_templates()
+    mocker.patch.object(PostNotificationRule, "coalesce_on_commit", True)
+    send_batch = mocker.spy(models.get_channel_instance("console"), "send_batch")
+    user = User.objects.create(
+        email="test@test.com",
+    )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        posts = [
+            Post.objects.create(
+                title=f"Title {i}",
+                description="Content",
+                is_published=True,
+                author=user,
+            )
+            for i in range(3)
+        ]
+
+    assert [len(call.args[0]) for call in send_batch.call_args_list] == [3]
+    assert all(post.notifications.count() == 1 for post in posts)
+    assert PostNotificationRule.objects.get().history.count() == 3
+
+
+def test_coalesced_rules_dropped_with_rolled_back_savepoint(
+    mocker: MockerFixture, django_capture_on_commit_callbacks: Any
+) -> None:
+    setup_published_notification()
+    setup_templates()
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    mocker.patch.object(PostNotificationRule, "coalesce_on_commit", True)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            kept = Post.objects.create(
+                title="Title 1",
+                description="Content 1",
+                is_published=True,
+                author=user,
+            )
+            with pytest.raises(RuntimeError), transaction.atomic():
+                Post.objects.create(
+                    title="Title 2",
+                    description="Content 2",
+                    is_published=True,
+                    author=user,
+                )
+                raise RuntimeError
+    assert list(NotificationHistory.objects.values_list("instance_id", flat=True)) == [
+        str(kept.pk)
+    ]
+
+
+def test_async_notifications_batched_per_transaction(
+    mocker: MockerFixture, django_capture_on_commit_callbacks: Any
+) -> None:
+    setup_async_published_notification()
+    setup_templates()
+    send_task = mocker.patch("df_notifications.models.app.send_task")
+    user = User.objects.create(
+        email="test@test.com",
+    )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        for i in range(3):
+            Post.objects.create(
+                title=f"Title {i}",
+                description="Content",
+                is_published=True,
+                author=user,
+            )
+        assert not send_task.called
+
+    send_task.assert_called_once()
+    [notifications] = send_task.call_args.kwargs["args"]
+    assert len(notifications) == 3
+
+    send_model_notifications_batch_task(notifications)
+    assert NotificationHistory.objects.count() == 3
+    assert AsyncPostNotificationRule.objects.get().history.count() == 3
+
+
+def test_async_notifications_batch_isolates_failures(
+    mocker: MockerFixture, django_capture_on_commit_callbacks: Any
+) -> None:
+    setup_async_published_notification()
+    setup_templates()
+    send_task = mocker.patch("df_notifications.models.app.send_task")
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        posts = [
+            Post.objects.create(
+                title=f"Title {i}",
+                description="Content",
+                is_published=True,
+                author=user,
+            )
+            for i in range(3)
+        ]
+    [notifications] = send_task.call_args.kwargs["args"]
+
+    send = models.NotificationModelMixin.send
+    calls = []
+
+    def fail_first(notification: Any, instance: Post) -> None:
+        calls.append(instance)
+        if len(calls) == 1:
+            raise RuntimeError("Failed")
+        send(notification, instance)
+
+    mocker.patch.object(models.NotificationModelMixin, "send", fail_first)
+    send_model_notifications_batch_task.apply(args=[notifications])
+
+    # The failed item is retried on its own after the others were sent
+    assert calls == [posts[0], posts[1], posts[2], posts[0]]
+    assert all(post.notifications.count() == 1 for post in posts)
+
+
+def test_async_notifications_dropped_with_rolled_back_savepoint(
+    mocker: MockerFixture, django_capture_on_commit_callbacks: Any
+) -> None:
+    setup_async_published_notification()
+    setup_templates()
+    send_task = mocker.patch("df_notifications.models.app.send_task")
+    user = User.objects.create(
+        email="test@test.com",
+    )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            kept = Post.objects.create(
+                title="Title 1",
+                description="Content 1",
+                is_published=True,
+                author=user,
+            )
+            post = Post.objects.create(
+                title="Title 2",
+                description="Content 2",
+                is_published=False,
+                author=user,
+            )
+            with pytest.raises(RuntimeError), transaction.atomic():
+                post.is_published = True
+                post.save()
+                raise RuntimeError
+
+    notifications = [
+        notification
+        for call in send_task.call_args_list
+        for notification in call.kwargs["args"][0]
+    ]
+    assert [notification[2] for notification in notifications] == [str(kept.pk)]
+
+
+def test_send_notification_fanout() -> None:
+    setup_plain_templates()
+    users = [
+        User.objects.create(username=f"user{i}", email=f"user{i}@test.com")
+        for i in range(5)
+    ]
+    assert list(get_user_id_ranges({"email__endswith": "@test.com"}, 2)) == [
+        (users[0].pk, users[1].pk),
+        (users[2].pk, users[3].pk),
+        (users[4].pk, users[4].pk),
+    ]
+
+    result = build_notification_fanout(
+        "console",
+        "df_notifications/posts/published/",
+        {"title": "title", "description": "description"},
+        user_filter={"email__endswith": "@test.com"},
+        chunk_size=2,
+        concurrency=2,
+    ).apply()
+
+    assert result.get() == 5
+    assert NotificationHistory.objects.count() == 3
+    assert {
+        user.pk
+        for notification in NotificationHistory.objects.all()
+        for user in notification.users.all()
+    } == {user.pk for user in users}
+
+
+def test_send_notification_fanout_skips_failed_chunks(mocker: MockerFixture) -> None:
+    setup_plain_templates()
+    users = [
+        User.objects.create(username=f"user{i}", email=f"user{i}@test.com")
+        for i in range(5)
+    ]
+    send = tasks.send_notification
+
+    def fail_first_chunk(chunk_users: Any, *args: Any) -> Any:
+        if users[0] in chunk_users:
+            raise RuntimeError("Failed")
+        return send(chunk_users, *args)
+
+    mocker.patch.object(tasks, "send_notification", side_effect=fail_first_chunk)
+    result = build_notification_fanout(
+        "console",
+        "df_notifications/posts/published/",
+        {"title": "title", "description": "description"},
+        user_filter={"email__endswith": "@test.com"},
+        chunk_size=2,
+        concurrency=1,
+    ).apply()
+
+    # The chunks after the failed one in the same chain were still sent
+    assert result.get() == 3
+    assert NotificationHistory.objects.count() == 2
+
+
+def test_reminder_state_recorded_and_rebuilt() -> None:
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+        repeat=2,
+        cooldown=timezone.timedelta(hours=1),
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    post = Post.objects.create(
+        title="Title 1",
+        description="Content 1",
+        is_published=True,
+        author=user,
+    )
+
+    PostNotificationReminder.invoke()
+    state = ReminderState.objects.for_reminder(reminder).get()
+    assert state.instance_id == str(post.pk)
+    assert state.sent_count == 1
+    assert not reminder.get_model_queryset().exists()
+
+    ReminderState.objects.update(
+        last_sent_at=timezone.now() - timezone.timedelta(hours=2)
+    )
+    assert list(reminder.get_model_queryset()) == [post]
+
+    ReminderState.objects.all().delete()
+    PostNotificationReminder.rebuild_state()
+    state = ReminderState.objects.for_reminder(reminder).get()
+    assert state.sent_count == 1
+    assert not reminder.get_model_queryset().exists()
+
+
+def test_reminder_state_backfilled_from_history() -> None:
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    Post.objects.create(
+        title="Title 1",
+        description="Content 1",
+        is_published=True,
+        author=user,
+    )
+    PostNotificationReminder.invoke()
+
+    # Upgrading from a version without ReminderState
+    ReminderState.objects.all().delete()
+    backfill_reminder_state(sender=None)
+    assert ReminderState.objects.for_reminder(reminder).get().sent_count == 1
+
+    # Existing state is kept
+    ReminderState.objects.update(sent_count=5)
+    backfill_reminder_state(sender=None)
+    assert ReminderState.objects.for_reminder(reminder).get().sent_count == 5
+
+    stdout = io.StringIO()
+    call_command(
+        "rebuild_reminder_state", "test_app.PostNotificationReminder", stdout=stdout
+    )
+    assert ReminderState.objects.for_reminder(reminder).get().sent_count == 1
+    assert "test_app.postnotificationreminder" in stdout.getvalue()
+
+
+def test_scheduled_reminder_processes_only_due_instances(mocker: MockerFixture) -> None:
+    mocker.patch.object(PostNotificationReminder, "scheduled", True)
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+        delay=timezone.timedelta(seconds=60),
+        cooldown=timezone.timedelta(hours=1),
+        repeat=2,
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    post = Post.objects.create(
+        title="Title 1",
+        description="Content 1",
+        is_published=True,
+        author=user,
+    )
+    state = ReminderState.objects.for_reminder(reminder).get()
+    assert state.due_at == post.updated + reminder.delay
+    assert PostNotificationReminder.get_next_due_at() == state.due_at
+
+    PostNotificationReminder.invoke()
+    assert not post.notifications.exists()
+
+    past = timezone.now() - timezone.timedelta(seconds=120)
+    Post.objects.update(updated=past)
+    ReminderState.objects.update(due_at=past + reminder.delay)
+    PostNotificationReminder.invoke()
+    assert post.notifications.count() == 1
+    state.refresh_from_db()
+    assert state.due_at == state.last_sent_at + reminder.cooldown
+
+    PostNotificationReminder.invoke()
+    assert post.notifications.count() == 1
+
+
+def test_scheduled_reminder_retries_failed_instances_later(
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch.object(PostNotificationReminder, "scheduled", True)
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+        repeat=2,
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    posts = [
+        Post.objects.create(
+            title=f"Title {i}",
+            description="Content",
+            is_published=True,
+            author=user,
+        )
+        for i in range(2)
+    ]
+    ReminderState.objects.update(due_at=timezone.now() - timezone.timedelta(hours=1))
+    mocker.patch.object(
+        models.get_channel_instance("console"),
+        "send",
+        side_effect=[None, RuntimeError("Failed")],
+    )
+
+    started = timezone.now()
+    PostNotificationReminder.invoke()
+    failed = ReminderState.objects.for_reminder(reminder).get(
+        instance_id=str(posts[1].pk)
+    )
+    assert failed.sent_count == 0
+    assert failed.due_at >= started + timezone.timedelta(
+        seconds=PostNotificationReminder.get_check_period()
+    )
+
+    # The wakeup waits for the retry instead of running again right away
+    cache.delete("df_notifications:reminders:wakeup:test_app.postnotificationreminder")
+    apply_async = mocker.patch.object(invoke_reminder_task, "apply_async")
+    schedule_reminder_wakeup(PostNotificationReminder)
+    assert apply_async.call_args.kwargs["countdown"] > (
+        PostNotificationReminder.get_check_period() - 10
+    )
+
+
+def test_reminder_chunks_processed_in_separate_tasks(mocker: MockerFixture) -> None:
+    mocker.patch.object(PostNotificationReminder, "chunk_size", 2)
+    delay = mocker.patch.object(
+        invoke_reminder_chunk_task,
+        "delay",
+        side_effect=lambda *args: invoke_reminder_chunk_task.apply(args).get(),
+    )
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    posts = [
+        Post.objects.create(
+            title=f"Title {i}",
+            description="Content",
+            is_published=True,
+            author=user,
+        )
+        for i in range(5)
+    ]
+
+    buckets = sorted({(post.pk // 2 * 2, post.pk // 2 * 2 + 1) for post in posts})
+    assert dispatch_reminder_chunks(PostNotificationReminder) == len(buckets)
+    assert [call.args[2:] for call in delay.call_args_list] == buckets
+    assert all(post.notifications.count() == 1 for post in posts)
+    assert ReminderState.objects.for_reminder(reminder).count() == 5
+
+    # Bounds do not shift when candidates of earlier chunks were sent
+    delay.reset_mock()
+    ReminderState.objects.filter(instance_id=str(posts[0].pk)).delete()
+    ReminderState.objects.filter(instance_id=str(posts[4].pk)).delete()
+    first_pk, last_pk = buckets[-1]
+    lock = (
+        "df_notifications:reminders:lock:test_app.postnotificationreminder:"
+        f"{reminder.pk}:{first_pk}:{last_pk}"
+    )
+    cache.add(lock, 1)
+    dispatch_reminder_chunks(PostNotificationReminder)
+    cache.delete(lock)
+    assert [call.args[2:] for call in delay.call_args_list] == [
+        buckets[0],
+        buckets[-1],
+    ]
+    assert posts[0].notifications.count() == 2
+    assert posts[4].notifications.count() == 1
+
+
+def test_periodic_task_registered_per_reminder_class(mocker: MockerFixture) -> None:
+    mocker.patch.object(PostNotificationReminder, "check_period", 5)
+    sender = mocker.Mock()
+    setup_periodic_tasks(sender)
+
+    calls = {
+        call.args[1].args: call.args[0]
+        for call in sender.add_periodic_task.call_args_list
+    }
+    assert calls == {
+        ("test_app.postnotificationreminder",): 5,
+        (
+            "test_app.asyncpostnotificationreminder",
+        ): api_settings.REMINDERS_CHECK_PERIOD,
+    }
+
+
+def test_incremental_reminder_scans_only_delta(mocker: MockerFixture) -> None:
+    mocker.patch.object(PostNotificationReminder, "incremental", True)
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+        delay=timezone.timedelta(seconds=60),
+        cooldown=timezone.timedelta(hours=1),
+        repeat=2,
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    recent, stale = [
+        Post.objects.create(
+            title=f"Title {i}",
+            description="Content",
+            is_published=True,
+            author=user,
+        )
+        for i in range(2)
+    ]
+
+    PostNotificationReminder.invoke()
+    watermark = ReminderWatermark.objects.for_reminder(reminder).get()
+    assert not NotificationHistory.objects.exists()
+
+    now = timezone.now()
+    ReminderWatermark.objects.update(scanned_at=now - timezone.timedelta(seconds=90))
+    Post.objects.filter(pk=recent.pk).update(
+        updated=now - timezone.timedelta(seconds=100)
+    )
+    Post.objects.filter(pk=stale.pk).update(updated=now - timezone.timedelta(hours=1))
+    PostNotificationReminder.invoke()
+    assert recent.notifications.count() == 1
+    assert not stale.notifications.exists()
+
+    ReminderWatermark.objects.update(scanned_at=now - timezone.timedelta(seconds=60))
+    ReminderState.objects.update(
+        last_sent_at=now - timezone.timedelta(hours=1, seconds=10)
+    )
+    PostNotificationReminder.invoke()
+    assert recent.notifications.count() == 2
+    assert not stale.notifications.exists()
+
+    ReminderWatermark.objects.update(
+        reconciled_at=watermark.reconciled_at - reminder.reconcile_period
+    )
+    PostNotificationReminder.invoke()
+    assert stale.notifications.count() == 1
+
+
+def test_conditions_pushed_down_to_queries(mocker: MockerFixture) -> None:
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+        is_published=False,
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    draft, published = [
+        Post.objects.create(
+            title="Title",
+            description="Content",
+            is_published=is_published,
+            author=user,
+        )
+        for is_published in (False, True)
+    ]
+    assert list(reminder.get_model_queryset()) == [draft]
+
+    mocker.patch.object(
+        PostNotificationRule, "condition_fields", {"channel": "description"}
+    )
+    rule = PostNotificationRule.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+        is_published_prev=False,
+    )
+    published.description = "console"
+    assert list(PostNotificationRule.get_queryset(published, draft)) == [rule]
+    assert list(PostNotificationRule.get_rules(published, draft)) == [rule]
+    published.description = "email"
+    assert not PostNotificationRule.get_queryset(published, draft).exists()
+    assert not PostNotificationRule.get_rules(published, draft)
+
+
+def test_reminder_delivers_batches(mocker: MockerFixture) -> None:
+    mocker.patch.object(api_settings, "REMINDERS_BATCH_SIZE", 3)
+    send_batch = mocker.spy(models.get_channel_instance("console"), "send_batch")
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    posts = [
+        Post.objects.create(
+            title=f"Title {i}",
+            description="Content",
+            is_published=True,
+            author=user,
+        )
+        for i in range(5)
+    ]
+
+    PostNotificationReminder.invoke()
+    assert [len(call.args[0]) for call in send_batch.call_args_list] == [3, 2]
+    assert reminder.history.count() == 5
+    assert all(post.notifications.count() == 1 for post in posts)
+    assert set(
+        ReminderState.objects.for_reminder(reminder).values_list(
+            "sent_count", flat=True
+        )
+    ) == {1}
+
+
+def test_reminder_skips_failed_deliveries(mocker: MockerFixture) -> None:
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    posts = [
+        Post.objects.create(
+            title=f"Title {i}",
+            description="Content",
+            is_published=True,
+            author=user,
+        )
+        for i in range(3)
+    ]
+    channel = models.get_channel_instance("console")
+    send = mocker.patch.object(
+        channel, "send", side_effect=[None, RuntimeError("Failed"), None]
+    )
+
+    PostNotificationReminder.invoke()
+    assert send.call_count == 3
+    assert reminder.history.count() == 2
+    assert set(
+        ReminderState.objects.for_reminder(reminder).values_list(
+            "instance_id", flat=True
+        )
+    ) == {str(posts[0].pk), str(posts[2].pk)}
+
+    mocker.stop(send)
+    PostNotificationReminder.invoke()
+    assert reminder.history.count() == 3
+    assert posts[1].notifications.count() == 1
+
+
+def test_reminder_honours_overridden_hooks(mocker: MockerFixture) -> None:
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    posts = [
+        Post.objects.create(
+            title=f"Title {i}",
+            description="Content",
+            is_published=True,
+            author=user,
+        )
+        for i in range(2)
+    ]
+
+    sent = []
+    mocker.patch.object(
+        PostNotificationReminder,
+        "send",
+        lambda self, instance: sent.append(instance),
+    )
+    PostNotificationReminder.invoke()
+    assert sent == posts
+    assert not reminder.history.exists()
+    assert ReminderState.objects.for_reminder(reminder).count() == 2
+
+    performed = []
+    mocker.patch.object(
+        PostNotificationReminder,
+        "perform_action",
+        lambda self, instance: performed.append(instance),
+    )
+    ReminderState.objects.all().delete()
+    PostNotificationReminder.invoke()
+    assert performed == posts
+    assert sent == posts
+
+
+def test_reminder_action_failures_isolated() -> None:
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+        action="assert instance.title != 'Title 0'\ninstance.title = 'done'\n"
+        "instance.save()",
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    for i in range(3):
+        Post.objects.create(
+            title=f"Title {i}",
+            description="Content",
+            is_published=True,
+            author=user,
+        )
+
+    PostNotificationReminder.invoke()
+    assert sorted(Post.objects.values_list("title", flat=True)) == [
+        "Title 0",
+        "done",
+        "done",
+    ]
+    assert ReminderState.objects.for_reminder(reminder).count() == 3
+
+
+def test_async_reminder_queues_notifications(
+    mocker: MockerFixture, django_capture_on_commit_callbacks: Any
+) -> None:
+    mocker.patch.object(api_settings, "REMINDERS_BATCH_SIZE", 2)
+    setup_templates()
+    send_task = mocker.patch("df_notifications.models.app.send_task")
+    reminder = AsyncPostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    for i in range(3):
+        Post.objects.create(
+            title=f"Title {i}",
+            description="Content",
+            is_published=True,
+            author=user,
+        )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        AsyncPostNotificationReminder.invoke()
+        assert not send_task.called
+        assert not NotificationHistory.objects.exists()
+
+    send_task.assert_called_once()
+    [notifications] = send_task.call_args.kwargs["args"]
+    assert len(notifications) == 3
+    assert ReminderState.objects.for_reminder(reminder).count() == 3
+
+    send_model_notifications_batch_task(notifications)
+    assert reminder.history.count() == 3
+
+
+def test_reminder_action_compiled_once(mocker: MockerFixture) -> None:
+    timings.reset()
+    models.compile_action.cache_clear()
+    setup_templates()
+    reminder = PostNotificationReminder.objects.create(
+        channel="console",
+        template_prefix="df_notifications/posts/published/",
+        action="instance.title = 'new title'; instance.save()",
+    )
+    user = User.objects.create(
+        email="test@test.com",
+    )
+    for i in range(3):
+        Post.objects.create(
+            title=f"Title {i}",
+            description="Content",
+            is_published=True,
+            author=user,
+        )
+
+    PostNotificationReminder.invoke()
+    assert set(Post.objects.values_list("title", flat=True)) == {"new title"}
+    assert models.compile_action.cache_info().misses == 1
+    stats = timings.get(
+        "reminders.action", reminder="test_app.postnotificationreminder", pk=reminder.pk
+    )
+    assert stats["count"] == 3
+
+    reminder.action = "instance.title = "
+    with pytest.raises(ValidationError) as e:
+        reminder.full_clean()
+    assert "action" in e.value.message_dict
+
+
+collected_timings = []
+
+
+def collect_timing(name: str, duration: float, **tags: Any) -> None:
+    collected_timings.append((name, tags))
+
+
+def test_notification_stage_timings(mocker: MockerFixture) -> None:
+    mocker.patch.object(
+        api_settings, "TIMING_HOOKS", ["tests.test_app.tests.collect_timing"]
+    )
+    timings.reset()
+    collected_timings.clear()
+    setup_plain_templates()
+    user = User.objects.create(email="test@test.com")
+
+    for _ in range(4):
+        send_notification(
+            [user],
+            "console",
+            "df_notifications/posts/published/",
+            {"title": "title", "description": "description"},
+        )
+
+    tags = {
+        "channel": "console",
+        "template_prefix": "df_notifications/posts/published/",
+    }
+    stats = timings.get("notifications.send", **tags)
+    assert stats["count"] == 4
+    assert stats["p50"] <= stats["p95"] <= stats["p99"] == stats["max"]
+    assert timings.get("notifications.history", **tags)["count"] == 4
+    assert timings.get("notifications.render", part="body.txt", **tags)["count"] == 4
+    assert ("notifications.send", tags) in collected_timings
+
+
+def test_benchmark_command_outputs_json(mocker: MockerFixture) -> None:
+    stdout = io.StringIO()
+    call_command(
+        "benchmark",
+        "--iterations=2",
+        "--rules",
+        "1",
+        "10",
+        "--state-rows",
+        "10",
+        stdout=stdout,
+    )
+
+    results = json.loads(stdout.getvalue())["results"]
+    assert [(r["name"], r["params"]) for r in results] == [
+        ("send_notification", {}),
+        ("send_notification_task", {"dispatch": "serialize"}),
+        ("rule_invoke", {"rules": 1}),
+        ("rule_invoke", {"rules": 10}),
+        ("reminder_scan", {"state_rows": 10}),
+    ]
+    assert results[1]["inline_per_op"] > 0
+    assert not Post.objects.exists()
+
+    mocker.patch.object(
+        send_notification_task.app,
+        "connection_for_write",
+        lambda: Connection("memory://"),
+    )
+    stdout = io.StringIO()
+    call_command(
+        "benchmark", "--iterations=2", "--rules=1", "--state-rows=1", stdout=stdout
+    )
+    results = json.loads(stdout.getvalue())["results"]
+    assert results[1]["params"] == {"dispatch": "broker"}
+
+
+def test_loadgen_command_reports_sink_deliveries(mocker: MockerFixture) -> None:
+    mocker.patch.object(api_settings, "SINK_CHANNEL_FAILURE_RATE", 0.5)
+    sink = models.get_channel_instance("sink")
+    sink.reset()
+    mocker.patch("random.random", side_effect=[0.9, 0.1] * 5)
+    stdout = io.StringIO()
+    call_command("loadgen", "--users=2", "--instances=10", stdout=stdout)
+
+    report = json.loads(stdout.getvalue())
+    assert report["notifications"] == 5
+    assert report["errors"] == 5
+    assert report["channel_failures"] == 5
+    assert report["queries_per_notification"] > 0
+    assert len(sink.deliveries) == 5
+    assert not Post.objects.exists()
+
+
+def test_email_channel_reuses_connection(mocker: MockerFixture) -> None:
+    mocker.patch.object(api_settings, "EMAIL_PER_RECIPIENT", True)
+    get_connection = mocker.spy(channels, "get_connection")
+    user1 = User.objects.create(username="user1", email="user1@test.com")
+    user2 = User.objects.create(username="user2", email="user2@test.com")
+    context = {"subject.txt": "Subject", "body.txt": "Body", "body.html": "<p>Body</p>"}
+    channel = EmailChannel()
+
+    channel.send_batch([([user1, user2], context), ([user1], context)])
+    channel.send([user2], context)
+
+    assert [message.to for message in mail.outbox] == [
+        ["user1@test.com"],
+        ["user2@test.com"],
+        ["user1@test.com"],
+        ["user2@test.com"],
+    ]
+    assert get_connection.call_count == 1
+
+    mocker.patch.object(api_settings, "EMAIL_CONNECTION_IDLE_TIMEOUT", -1)
+    channel.send([user1], context)
+    assert get_connection.call_count == 2
+
+
+def test_email_channel_batch_results_and_reconnect(mocker: MockerFixture) -> None:
+    get_connection = mocker.spy(channels, "get_connection")
+    user = User.objects.create(username="user1", email="user1@test.com")
+    context = {"subject.txt": "Subject", "body.txt": "Body", "body.html": "<p>Body</p>"}
+    channel = EmailChannel()
+
+    results = channel.send_batch(
+        [([user], context), ([user], {"subject.txt": "Subject"}), ([user], context)]
+    )
+    assert results[0] is None
+    assert isinstance(results[1], KeyError)
+    assert results[2] is None
+    assert len(mail.outbox) == 2
+    assert get_connection.call_count == 1
+
+    # The server closed the connection before the idle timeout
+    mocker.patch.object(
+        channel._local.connection,
+        "send_messages",
+        side_effect=SMTPServerDisconnected,
+    )
+    channel.send([user], context)
+    assert len(mail.outbox) == 3
+    assert get_connection.call_count == 2
+
+
+class FakeFCMClient:
+    def __init__(self, invalid_tokens: Any) -> None:
+        self.invalid_tokens = set(invalid_tokens)
+        self.batches = []
+
+    def send_each(self, messages: Any) -> BatchResponse:
+        self.batches.append(sorted(message.token for message in messages))
+        return BatchResponse(
+            [
+                SendResponse(None, UnregisteredError("Unregistered"))
+                if message.token in self.invalid_tokens
+                else SendResponse({"name": message.token}, None)
+                for message in messages
+            ]
+        )
+
+
+def test_firebase_push_channel_multicast_engine(mocker: MockerFixture) -> None:
+    mocker.patch.object(api_settings, "PUSH_CHUNK_SIZE", 2)
+    user = User.objects.create(email="test@test.com")
+    models.UserDevice.objects.bulk_create(
+        [
+            models.UserDevice(user=user, registration_id=f"token-{i}", type="web")
+            for i in range(5)
+        ]
+    )
+    client = FakeFCMClient(["token-1", "token-4"])
+
+    FirebasePushChannel(client).send(
+        users=[user],
+        context={"subject.txt": "subject", "body.txt": "body", "data.json": "{}"},
+    )
+
+    assert sorted(token for batch in client.batches for token in batch) == [
+        f"token-{i}" for i in range(5)
+    ]
+    assert max(len(batch) for batch in client.batches) == 2
+    assert set(
+        models.UserDevice.objects.filter(active=False).values_list(
+            "registration_id", flat=True
+        )
+    ) == {"token-1", "token-4"}
+
+
+def test_push_engine_bounds_chunks_in_flight(mocker: MockerFixture) -> None:
+    mocker.patch.object(api_settings, "PUSH_CHUNK_SIZE", 1)
+    mocker.patch.object(api_settings, "PUSH_CONCURRENCY", 2)
+    user = User.objects.create(email="test@test.com")
+    models.UserDevice.objects.bulk_create(
+        [
+            models.UserDevice(user=user, registration_id=f"token-{i}", type="web")
+            for i in range(6)
+        ]
+    )
+    client = FakeFCMClient([])
+    send_each = client.send_each
+    mocker.patch.object(
+        client, "send_each", side_effect=lambda m: time.sleep(0.01) or send_each(m)
+    )
+    engine = PushEngine(client)
+    submitted = []
+    submit = engine.executor.submit
+
+    def tracked_submit(*args: Any) -> Any:
+        assert sum(not future.done() for future in submitted) < 2
+        submitted.append(submit(*args))
+        return submitted[-1]
+
+    mocker.patch.object(engine.executor, "submit", side_effect=tracked_submit)
+
+    results = engine.send(Message(), models.UserDevice.objects.all())
+
+    assert len(submitted) == 6
+    assert sorted(results) == [f"token-{i}" for i in range(6)]
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append((self.path, body.decode()))
+        if body.startswith(b"["):
+            items = json.loads(body)
+            response = json.dumps([{"accepted": item["id"]} for item in items])
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response.encode())
+        else:
+            self.send_response(204)
+            self.end_headers()
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def test_webhook_channel_delivers_batches_over_sessions() -> None:
+    timings.reset()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"127.0.0.1:{server.server_address[1]}"
+    channel = JSONPostWebhookChannel()
+
+    try:
+        channel.send_batch(
+            [
+                (
+                    [],
+                    {
+                        "subject.txt": f"http://{host}/hook/{i}",
+                        "body.txt": f"body {i}",
+                        "data.json": "{}",
+                    },
+                )
+                for i in range(5)
+            ]
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert sorted(server.received) == [(f"/hook/{i}", f"body {i}") for i in range(5)]
+    assert timings.get("webhooks.post", host=host)["count"] == 5
+
+
+def test_webhook_channel_batches_per_url(mocker: MockerFixture) -> None:
+    mocker.patch.object(api_settings, "WEBHOOK_BATCH_SIZE", 2)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    channel = JSONPostWebhookChannel()
+
+    def context(path: str, i: int) -> dict:
+        return {
+            "subject.txt": f"{base}{path}",
+            "body.txt": "",
+            "data.json": json.dumps({"id": i}),
+        }
+
+    try:
+        contexts = [context("/a", 0), context("/b", 1), context("/a", 2)]
+        contexts.append(context("/a", 3))
+        results = channel.deliver(contexts)
+        assert results == [{"accepted": i} for i in range(4)]
+        assert sorted(server.received) == [
+            ("/a", '[{"id": 0}, {"id": 2}]'),
+            ("/a", '[{"id": 3}]'),
+            ("/b", '[{"id": 1}]'),
+        ]
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_webhook_history_written_for_delivered_items() -> None:
+    Template.objects.create(
+        name="df_notifications/hooks/subject.txt", content="{{ url }}"
+    )
+    Template.objects.create(name="df_notifications/hooks/body.txt", content="")
+    Template.objects.create(name="df_notifications/hooks/data.json", content="{}")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with socket.socket() as closed:
+        closed.bind(("127.0.0.1", 0))
+        unreachable = f"http://127.0.0.1:{closed.getsockname()[1]}/hook"
+
+    try:
+        notifications = send_notifications_bulk(
+            [
+                ([], {"url": f"http://127.0.0.1:{server.server_address[1]}/hook"}),
+                ([], {"url": unreachable}),
+            ],
+            channel="webhook",
+            template_prefixes="df_notifications/hooks/",
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert notifications[0] is not None
+    assert notifications[1] is None
+    assert list(NotificationHistory.objects.all()) == [notifications[0]]